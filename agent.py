@@ -8,6 +8,7 @@ import time
 
 import config
 from config import Colors
+import metrics
 from connection_manager import SocketClient
 from llm_client import LLMClient
 from graph import build_graph
@@ -33,6 +34,9 @@ def main():
     # 确保反思存储目录存在
     os.makedirs(config.REFLECTIONS_DIR, exist_ok=True)
 
+    # 指标：定期写入 logs/metrics，配置了 AGENT_METRICS_PORT 时提供本地 /metrics 接口
+    metrics.start()
+
     # 编译 LangGraph 图
     compiled_graph = build_graph()
     log_colored("系统", "LangGraph 状态图已编译", Colors.WHITE)
@@ -49,6 +53,7 @@ def main():
         "llm": llm,
         "server_output": "",
         "server_output_clean": "",
+        "server_data": {},
         "history": [],
         "knowledge_base": load_kb(phase=1),  # 加载阶段1知识库
         "phase": 1,
@@ -59,6 +64,12 @@ def main():
         "environment_type": "unknown",
         "analysis": "",
         "payload": "",
+        "commands": [],
+        "pending_output": "",
+        "active_skill": "",
+        "skill_failure": "",
+        "reflex_rule": "",
+        "early_payload": "",
         "should_reconnect": False,
         "should_stop": False,
         "should_exit": False,
@@ -79,10 +90,14 @@ def main():
             current_state["llm"] = llm
             current_state["server_output"] = ""
             current_state["server_output_clean"] = ""
+            current_state["server_data"] = {}
             current_state["should_reconnect"] = False
             current_state["should_stop"] = False
             current_state["should_exit"] = False
             current_state["payload"] = ""
+            current_state["commands"] = []
+            current_state["pending_output"] = ""
+            current_state["active_skill"] = ""
             current_state["kb_update_future"] = None
 
             # 从磁盘重新加载当前阶段知识库（防止断连丢失）
@@ -120,6 +135,10 @@ def main():
             time.sleep(5)
         finally:
             client.disconnect()
+            log_colored("系统", f"LLM 用量：{llm.format_usage()}", Colors.WHITE)
+            if llm.cache is not None:
+                log_colored("系统", f"LLM 响应缓存：{llm.cache.stats()}", Colors.WHITE)
+            metrics.registry.dump()
 
 
 if __name__ == "__main__":
@@ -19,6 +19,97 @@ def _load_api_key():
 # --- Socket 连接配置 ---
 TARGET_IP = os.environ.get("AGENT_TARGET_IP", "127.0.0.1")
 TARGET_PORT = int(os.environ.get("AGENT_TARGET_PORT", 4000))
+SOCKET_CONNECT_TIMEOUT = 5.0     # 建立连接的超时（秒）
+RECEIVE_TIMEOUT = 2.0            # observe 在缓冲区为空时最多等待的时间（秒）
+RECEIVE_IDLE_MS = 300            # 聚合接收：流静默超过该毫秒数即视为一条消息结束
+RECEIVE_MAX_BYTES = 64 * 1024    # 聚合接收：单条消息最大字节数
+RECEIVE_MAX_WAIT = 5.0           # 聚合接收：单条消息最长聚合时间（秒）
+# 未完成尾行匹配以下任一模式时，认为服务器在等待输入，立即结束聚合（见 prompt_detector）
+PROMPT_PATTERNS = [
+    r"[>:：?？]\s*$",
+    r"\[More\]",
+    r"== 未完继续.*==",
+    r"\(y/n\)",
+]
+SERVER_PROMPT_PATTERNS = {}      # 按服务器（"ip:port"）追加的提示符模式
+PROMPT_LEARN_THRESHOLD = 3       # 同一未结束尾行在静默时出现 N 次后学习为提示符
+PROMPT_LEARN_MAX_LENGTH = 40     # 可学习的尾行最大长度
+ACT_RESPONSE_TIMEOUT = 1.0       # act 发送后等待服务器开始响应的默认时间（尚未学习到该命令延迟时，秒）
+
+# --- 反射规则配置（见 reflex.py） ---
+# 对输出最后一行匹配的确定性规则：命中时直接发送 response，不调用 LLM。
+# response 中的 {变量} 取自 REFLEX_VARIABLES，变量为空时该规则不启用。
+REFLEX_RULES = [
+    {"name": "more", "pattern": r"\[More\]|== 未完继续.*==", "response": ""},
+    {"name": "english_name", "pattern": r"您的英文名字[:：]?\s*$", "response": "{name}"},
+    {"name": "press_any_key", "pattern": r"[Pp]ress (?:any key|RETURN|ENTER)|按任意键|请按回车", "response": ""},
+]
+SERVER_REFLEX_RULES = {}         # 按服务器（"ip:port"）追加的反射规则
+REFLEX_VARIABLES = {
+    "name": os.environ.get("AGENT_MUD_NAME", ""),
+}
+REFLEX_LEARN_THRESHOLD = 3       # 同一尾行提示连续 N 次得到 analyze 相同回应后学习为规则
+REFLEX_LEARN_MIN_LETTERS = 2     # 尾行至少包含 N 个字母或汉字才学习（排除 ">"、"[100]>" 这类裸命令提示符）
+REFLEX_LEARN_MAX_DIGIT_RATIO = 0.3  # 数字占尾行非空白字符的比例超过该值时视为状态栏，不学习
+# 匹配以下任一模式的尾行视为状态栏，不学习（回应取决于当时的状态而不是提示本身）
+REFLEX_LEARN_DENY_PATTERNS = [
+    r"\d+\s*/\s*\d+",
+    r"\b(?:[Hh][Pp]|[Mm][Pp]|[Ss][Pp]|[Mm][Vv]|[Ee][Xx][Pp])\b",
+    r"气血|精神|内力|精力|体力|经验|潜能",
+]
+REFLEX_MAX_REPEATS = 3           # 同一规则对不变的输出连续命中 N 次后不再回应（学习到的规则被删除）
+REFLEX_MAX_STREAK = 20           # 连续命中 N 次（中间没有 analyze）后，下一条消息交给 analyze
+REFLEX_STATS_INTERVAL = 50       # 每检查 N 条消息记录一次反射命中率
+
+# --- 决策缓存配置（见 decision_cache.py） ---
+DECISION_CACHE_SIZE = 512        # 最多缓存的决策数（LRU 淘汰）
+DECISION_CACHE_TTL = 1800        # 决策有效期（秒）
+DECISION_CACHE_HISTORY = 3       # 键中包含的最近命令条数
+DECISION_CACHE_MIN_CONFIDENCE = 2  # LLM 对同一情形给出相同命令的次数达到该值才复用
+
+# --- 知识库检索配置（见 kb_index.py） ---
+KB_TOP_K = 20                    # 每次放进 prompt 的知识条目数（按 BM25 相关度挑选）
+KB_BM25_K1 = 1.2                 # BM25 词频饱和参数
+KB_BM25_B = 0.75                 # BM25 文档长度归一化参数
+KB_FIELD_BOOST = 2               # keywords / specific_type 中的词相对正文的权重
+
+# --- 经验检索配置（见 experience_index.py） ---
+EXPERIENCE_TOP_K = 5             # 每次放进 prompt 的经验条数
+SKILL_TOP_K = 8                  # 每次放进 prompt 的技能个数
+EXPERIENCE_NGRAM_RANGE = (2, 3)  # 字符 n-gram 长度范围
+EXPERIENCE_HASH_DIM = 1 << 18    # n-gram 哈希维度
+EXPERIENCE_FIELD_BOOST = 2       # tags / trigger 中的 n-gram 相对正文的权重
+EXPERIENCE_TAG_BONUS = 0.2       # tag 整词出现在查询中时的额外得分
+EXPERIENCE_MIN_SCORE = 0.05      # 低于该相似度的条目不选入
+
+# --- 节奏控制配置（见 pacing.py） ---
+PACING_EWMA_ALPHA = 0.3          # 每个命令动词响应延迟的 EWMA 平滑系数
+PACING_MARGIN = 2.0              # 等待预算 = 延迟估计 × 该倍数
+PACING_MIN_WAIT = 0.05           # 等待预算下限（秒）
+PACING_MAX_WAIT = 3.0            # 等待预算上限（秒），慢命令最多等这么久
+SERVER_MAX_COMMANDS_PER_SECOND = 4.0  # 服务器侧速率限制：每秒最多发送的命令数
+
+# --- 技能宏配置（见 macro.py） ---
+MACRO_STEP_TIMEOUT = 3.0         # 宏的一步在节奏预算内未开始响应时，额外等待响应的时间（秒）
+# 任一步骤的响应匹配以下模式即视为失败，交回 LLM 处理
+MACRO_FAIL_PATTERNS = [
+    r"^\s*什么？",
+    r"^\s*(?:What|Huh)\?",
+]
+TELNET_MCCP2 = True              # 接受服务器的 MCCP2（Telnet 选项 86）压缩下行流
+TELNET_GMCP = True               # 接受 GMCP（选项 201），以 JSON 接收房间/状态/物品等结构化数据
+TELNET_MSDP = True               # 接受 MSDP（选项 69）
+GMCP_SUPPORTS = ["Char 1", "Char.Items 1", "Room 1", "Comm.Channel 1"]
+MSDP_REPORT_VARIABLES = ["ROOM", "ROOM_NAME", "ROOM_EXITS", "HEALTH", "HEALTH_MAX", "MANA", "MANA_MAX"]
+
+# --- 输出过滤配置 ---
+# 每项为内置过滤器名（见 output_filters.BUILTIN_FILTERS）或 {"name", "pattern", "contains"} 字典
+OUTPUT_FILTERS = ["compiler_warning"]
+# 按服务器（"ip:port"）追加的过滤器，例如 {"127.0.0.1:4000": ["channel_chat"]}
+SERVER_OUTPUT_FILTERS = {}
+FILTER_STATS_INTERVAL = 50       # 每处理 N 条消息记录一次过滤器统计
+DEDUP_WINDOW_SECONDS = 300       # 广播去重的滑动时间窗口（秒）
+DEDUP_MAX_IDLE_SKIPS = 3         # 连续多少条纯重复广播消息后仍交给分析节点
 
 # --- 智能体运行配置 ---
 MAX_HISTORY_ROUNDS = 50
@@ -33,8 +124,11 @@ REFLECTIONS_DIR = os.path.join(DATA_DIR, "reflections")
 EXPERIENCES_FILE = os.path.join(REFLECTIONS_DIR, "experiences.json")
 KB_FILE = os.path.join(DATA_DIR, "knowledge_base.json")  # 保留兼容
 KB_DIR = os.path.join(DATA_DIR, "knowledge_bases")  # 阶段化知识库目录
+PROMPT_DIR = os.path.join(DATA_DIR, "prompts")      # 学习到的提示符模式（按服务器）
+REFLEX_DIR = os.path.join(DATA_DIR, "reflexes")     # 学习到的反射规则（按服务器）
 KB_CONSOLIDATION_INTERVAL = 20  # 每隔 N 轮整理一次知识库
 MAX_TASK_ATTEMPTS = 50           # 单个任务最大尝试轮数，超过则判定为僵局
+MAX_PIPELINE_COMMANDS = 5        # analyze 单次最多可流水线发送的命令数
 
 # --- LLM 配置 ---
 API_KEY = os.environ.get("DEEPSEEK_API_KEY", _load_api_key())
@@ -42,6 +136,67 @@ BASE_URL = os.environ.get("DEEPSEEK_BASE_URL", "https://api.deepseek.com")
 MODEL = os.environ.get("DEEPSEEK_MODEL", "deepseek-chat")
 REASONER_MODEL = os.environ.get("DEEPSEEK_REASONER_MODEL", "deepseek-reasoner")
 
+# --- LLM 连接池与并发配置（见 llm_client.AsyncLLMClient） ---
+LLM_TIMEOUT = 600.0              # 单次请求超时（秒），推理模型可能需要数分钟
+LLM_CONNECT_TIMEOUT = 10.0       # 建立连接超时（秒）
+LLM_MAX_CONNECTIONS = 16         # 连接池最大连接数
+LLM_MAX_KEEPALIVE_CONNECTIONS = 8  # 保持长连接的空闲连接数
+LLM_KEEPALIVE_EXPIRY = 120.0     # 空闲长连接保留时间（秒）
+LLM_DEFAULT_CONCURRENCY = 4      # 每个模型默认的最大并发请求数
+LLM_MODEL_CONCURRENCY = {        # 按模型覆盖最大并发请求数
+    REASONER_MODEL: 2,
+}
+LLM_CORRECTION_MAX_CHARS = 8000  # 纠正调用最多发回的错误输出字符数
+LLM_STREAM_ANALYZE = True        # analyze 流式调用，next_payload 生成完毕即提前发送
+
+# --- Prompt token 预算（见 prompt_builder.py） ---
+# 各片段的上限（按行裁剪，保留最相关或最新的部分），决定每次调用的常规开销
+PROMPT_KB_TOKENS = 1500          # analyze 的知识库片段（约 30 条）
+PROMPT_PREV_KB_TOKENS = 800      # manage_knowledge 的以前阶段知识（约 15 条）
+PROMPT_TASK_LOG_TOKENS = 4000    # reflector 的任务日志（约 8000 字符）
+# 整个 system prompt 的兜底上限，超出时按片段优先级裁剪；为输出和用户消息留出余量
+PROMPT_DEFAULT_TOKEN_BUDGET = 24000
+PROMPT_TOKEN_BUDGETS = {
+    MODEL: 24000,
+    REASONER_MODEL: 32000,
+}
+
+# --- LLM 容错配置（见 llm_resilience.py） ---
+LLM_LATENCY_WINDOW = 100         # 每个端点保留的最近延迟样本数
+LLM_HEDGE_MIN_SAMPLES = 20       # 样本数达到该值后才启用对冲请求
+LLM_HEDGE_CALLERS = ["Analyze"]  # 启用对冲请求的调用方（caller_id 中 "[" 之前的部分）：超过 p95 延迟再发一个相同请求
+LLM_BREAKER_FAILURES = 3         # 端点连续失败 N 次后熔断
+LLM_BREAKER_COOLDOWN = 60.0      # 熔断冷却时间（秒），期间使用备用端点
+# 按模型配置的备用端点：{"model": 备用模型, "base_url": 备用地址, "api_key": 备用 Key}，留空的字段沿用主端点
+LLM_FALLBACKS = {}
+if os.environ.get("DEEPSEEK_FALLBACK_MODEL") or os.environ.get("DEEPSEEK_FALLBACK_BASE_URL"):
+    LLM_FALLBACKS[MODEL] = {
+        "model": os.environ.get("DEEPSEEK_FALLBACK_MODEL"),
+        "base_url": os.environ.get("DEEPSEEK_FALLBACK_BASE_URL"),
+        "api_key": os.environ.get("DEEPSEEK_FALLBACK_API_KEY"),
+    }
+# 重试预算：每个调用方（caller_id 中 "[" 之前的部分）在窗口内最多重试的次数，跨调用共享
+LLM_RETRY_BUDGET_WINDOW = 300.0  # 预算从耗尽到恢复满所需的时间（秒）
+LLM_DEFAULT_RETRY_BUDGET = 5     # 未单独配置的调用方（规划者、反思者等）
+LLM_RETRY_BUDGETS = {
+    "Analyze": 3,                # 失败时本轮跳过，下一轮重新决策
+    "KnowledgeManager": 2,       # 每轮都会调用，故障期间不能拖住 sync_kb
+    "KB-Consolidate": 2,
+}
+
+# --- 指标配置（见 metrics.py） ---
+METRICS_DIR = os.path.join(LOG_DIR, "metrics")
+METRICS_DUMP_INTERVAL = 60       # 每隔 N 秒把指标快照写入 METRICS_DIR
+METRICS_HTTP_PORT = int(os.environ.get("AGENT_METRICS_PORT", 0))  # 本地 Prometheus /metrics 端口，0 表示不启用
+METRICS_LATENCY_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300, 600)  # LLM 延迟直方图分桶（秒）
+
+# --- LLM 响应缓存配置（见 llm_cache.py） ---
+LLM_CACHE_ENABLED = True
+LLM_CACHE_FILE = os.path.join(DATA_DIR, "llm_cache.sqlite3")
+LLM_CACHE_MAX_ENTRIES = 2000     # 超过后按最近使用时间淘汰
+# 使用缓存的调用方（caller_id 前缀）：规划和反思的输入在重连/重启后常常完全相同
+LLM_CACHE_CALLERS = ["Planner-", "Reflector"]
+
 # --- 颜色配置 ---
 class Colors:
     RESET = "\033[0m"
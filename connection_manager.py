@@ -1,11 +1,371 @@
 """
 Socket 连接管理模块
 管理与 MUD 服务器的 TCP 连接，提供收发数据和 ANSI 清洗功能。
+
+连接基于 asyncio transport/protocol：后台线程运行独立的事件循环，
+协议对象持续把 socket 数据读入内存缓冲区，receive() 只从缓冲区取数据，
+analyze 等待 LLM 期间服务器发来的内容不会滞留在内核缓冲区。
 """
-import socket
+import asyncio
+import codecs
+import json
 import re
+import threading
+import time
+import zlib
+from collections import deque
+from typing import Any
+
 import config
 from config import Colors
+from prompt_detector import PromptDetector
+
+
+# ANSI 转义序列（单字符 ESC 序列与 CSI 序列）
+_ANSI_PATTERN = r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])'
+_ANSI_RE = re.compile(_ANSI_PATTERN)
+# ANSI 序列或除换行外的 C0 控制字符 / DEL，一次扫描全部删除
+_ANSI_AND_CONTROL_RE = re.compile(_ANSI_PATTERN + r'|[\x00-\x09\x0b-\x1f\x7f]')
+# str.translate 删除表：除换行外的 C0 控制字符和 DEL
+_CONTROL_DELETE_TABLE = dict.fromkeys([c for c in range(32) if c != 10] + [127])
+
+
+class LineFramer:
+    """
+    服务器输出的流式分帧器。
+
+    使用增量解码器跨读取保留未完成的多字节字符，把输出切分为完整行和
+    尚未以换行结束的尾部（通常是等待输入的提示符），并保留本批原始字节，
+    通过 memoryview 零拷贝访问。每个字节只解码一次。
+    """
+
+    def __init__(self, encoding: str = "utf-8"):
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors="ignore")
+        self._raw = bytearray()
+        self._lines: list[str] = []
+        self._partial = ""
+
+    def feed(self, data: bytes):
+        """追加一段原始字节"""
+        self._raw += data
+        text = self._partial + self._decoder.decode(data)
+        *lines, self._partial = text.split("\n")
+        for line in lines:
+            self._lines.append(line[:-1] if line.endswith("\r") else line)
+
+    @property
+    def partial(self) -> str:
+        """尚未以换行结束的尾部（可能是提示符）"""
+        return self._partial
+
+    def has_data(self) -> bool:
+        """是否有可取出的文本（不含解码器中未完成的字节）"""
+        return bool(self._lines or self._partial)
+
+    def pending_bytes(self) -> int:
+        """自上次 drain 以来累积的原始字节数"""
+        return len(self._raw)
+
+    def drain(self, include_partial: bool = True) -> tuple[list[str], str, memoryview]:
+        """
+        取出已分帧的数据。
+
+        Returns:
+            (完整行列表, 尾部片段, 本批原始字节的 memoryview)
+            include_partial=False 时尾部保留在分帧器中，返回空字符串。
+        """
+        lines, self._lines = self._lines, []
+        partial = ""
+        if include_partial:
+            partial, self._partial = self._partial, ""
+        # 交换缓冲区而不是复制：旧 bytearray 不再被写入，可安全导出 memoryview
+        raw, self._raw = self._raw, bytearray()
+        return lines, partial, memoryview(raw)
+
+    def reset(self):
+        """丢弃所有状态（重连时使用）"""
+        self._decoder.reset()
+        self._raw = bytearray()
+        self._lines = []
+        self._partial = ""
+
+
+# --- Telnet 协议常量（RFC 854/855） ---
+IAC = 255
+DONT = 254
+DO = 253
+WONT = 252
+WILL = 251
+SB = 250
+GA = 249
+NOP = 241
+SE = 240
+EOR = 239
+
+OPT_ECHO = 1
+OPT_SGA = 3
+OPT_MSDP = 69
+OPT_MCCP2 = 86
+OPT_GMCP = 201
+
+# --- MSDP 控制字节 ---
+MSDP_VAR = 1
+MSDP_VAL = 2
+MSDP_TABLE_OPEN = 3
+MSDP_TABLE_CLOSE = 4
+MSDP_ARRAY_OPEN = 5
+MSDP_ARRAY_CLOSE = 6
+
+
+def decode_gmcp(payload: bytes) -> tuple[str, Any]:
+    """解析 GMCP 负载 "Package.Name <json>"，返回 (包名, 数据)"""
+    text = payload.decode("utf-8", errors="ignore").strip()
+    package, _, body = text.partition(" ")
+    body = body.strip()
+    if not body:
+        return package, None
+    try:
+        return package, json.loads(body)
+    except json.JSONDecodeError:
+        return package, body
+
+
+def decode_msdp(payload: bytes) -> dict:
+    """解析 MSDP 负载（VAR/VAL/TABLE/ARRAY 编码）为字典"""
+    pos = 0
+    n = len(payload)
+
+    def read_scalar() -> str:
+        nonlocal pos
+        start = pos
+        while pos < n and payload[pos] > MSDP_ARRAY_CLOSE:
+            pos += 1
+        return payload[start:pos].decode("utf-8", errors="ignore")
+
+    def read_value():
+        nonlocal pos
+        if pos < n and payload[pos] == MSDP_TABLE_OPEN:
+            pos += 1
+            table = read_pairs(MSDP_TABLE_CLOSE)
+            pos += 1
+            return table
+        if pos < n and payload[pos] == MSDP_ARRAY_OPEN:
+            pos += 1
+            items = []
+            while pos < n and payload[pos] != MSDP_ARRAY_CLOSE:
+                if payload[pos] == MSDP_VAL:
+                    pos += 1
+                    items.append(read_value())
+                else:
+                    pos += 1
+            pos += 1
+            return items
+        return read_scalar()
+
+    def read_pairs(terminator) -> dict:
+        nonlocal pos
+        result = {}
+        while pos < n and payload[pos] != terminator:
+            if payload[pos] != MSDP_VAR:
+                pos += 1
+                continue
+            pos += 1
+            name = read_scalar()
+            values = []
+            while pos < n and payload[pos] == MSDP_VAL:
+                pos += 1
+                values.append(read_value())
+            result[name] = values[0] if len(values) == 1 else values
+        return result
+
+    return read_pairs(None)
+
+
+def encode_msdp(variable: str, *values: str) -> bytes:
+    """编码一条 MSDP 变量（用于 REPORT 等命令）"""
+    out = bytearray((MSDP_VAR,)) + variable.encode("utf-8")
+    for value in values:
+        out.append(MSDP_VAL)
+        out += value.encode("utf-8")
+    return bytes(out)
+
+
+def telnet_subnegotiation(option: int, payload: bytes) -> bytes:
+    """构造 IAC SB <option> <payload> IAC SE（负载中的 255 需转义）"""
+    return bytes((IAC, SB, option)) + payload.replace(b"\xff", b"\xff\xff") + bytes((IAC, SE))
+
+
+class TelnetParser:
+    """
+    Telnet 协议字节级状态机。
+
+    feed() 剥离数据流中的 IAC 序列，只返回纯数据字节：
+    - WILL/WONT/DO/DONT：按支持的选项集合立即应答，不支持的选项直接拒绝；
+      应答字节累积在 replies 中，由调用方写回服务器
+    - SB ... IAC SE：子协商负载作为结构化事件累积在 events 中
+    - GA/EOR 等命令：作为事件上报，其余命令忽略
+    - MCCP2 启动（IAC SB 86 IAC SE）：立即停止解析，置 compress_started，
+      其后的字节已是 zlib 压缩流，通过 take_tail() 交还调用方解压
+    """
+
+    _DATA, _IAC, _OPT, _SB, _SB_IAC = range(5)
+
+    def __init__(self, accept_remote=(OPT_ECHO, OPT_SGA), accept_local=()):
+        self.accept_remote = set(accept_remote)  # 允许服务器启用的选项（WILL → DO）
+        self.accept_local = set(accept_local)    # 允许本端启用的选项（DO → WILL）
+        self.remote_enabled = set()
+        self.local_enabled = set()
+        self.replies = bytearray()
+        self.events: list[dict] = []
+
+        self._state = self._DATA
+        self._verb = None
+        self._sb_option = None
+        self._sb_buf = bytearray()
+
+        self.compress_started = False
+        self._tail = b""
+
+    def feed(self, data: bytes) -> bytes:
+        """解析一段原始字节，返回剥离 Telnet 序列后的数据字节"""
+        out = bytearray()
+        i, n = 0, len(data)
+        while i < n:
+            state = self._state
+            if state == self._DATA:
+                # 快速路径：整段拷贝到下一个 IAC 之前
+                j = data.find(b"\xff", i)
+                if j < 0:
+                    out += data[i:]
+                    break
+                out += data[i:j]
+                self._state = self._IAC
+                i = j + 1
+                continue
+
+            byte = data[i]
+            i += 1
+            if state == self._IAC:
+                if byte == IAC:
+                    out.append(IAC)  # IAC IAC 转义为数据字节 255
+                    self._state = self._DATA
+                elif byte in (WILL, WONT, DO, DONT):
+                    self._verb = byte
+                    self._state = self._OPT
+                elif byte == SB:
+                    self._sb_option = None
+                    self._sb_buf.clear()
+                    self._state = self._SB
+                else:
+                    if byte in (GA, EOR):
+                        self.events.append({"type": "command", "command": byte})
+                    self._state = self._DATA
+            elif state == self._OPT:
+                self._negotiate(self._verb, byte)
+                self._state = self._DATA
+            elif state == self._SB:
+                if byte == IAC:
+                    self._state = self._SB_IAC
+                elif self._sb_option is None:
+                    self._sb_option = byte
+                else:
+                    self._sb_buf.append(byte)
+            elif state == self._SB_IAC:
+                if byte == SE:
+                    option = self._sb_option
+                    self._finish_subnegotiation()
+                    self._state = self._DATA
+                    if option == OPT_MCCP2 and OPT_MCCP2 in self.remote_enabled:
+                        # 压缩从 IAC SE 之后的下一个字节开始
+                        self.compress_started = True
+                        self._tail = data[i:]
+                        break
+                else:
+                    # IAC IAC 为负载中的 255；其他字节属于协议错误，按数据保留
+                    self._sb_buf.append(byte)
+                    self._state = self._SB
+        return bytes(out)
+
+    def take_tail(self) -> bytes:
+        """MCCP2 启动后取出本段剩余的压缩字节，并清除 compress_started"""
+        tail, self._tail = self._tail, b""
+        self.compress_started = False
+        return tail
+
+    def take_replies(self) -> bytes:
+        """取出待发送的协商应答"""
+        replies = bytes(self.replies)
+        self.replies.clear()
+        return replies
+
+    def take_events(self) -> list[dict]:
+        """取出累积的结构化事件"""
+        events, self.events = self.events, []
+        return events
+
+    def _reply(self, verb: int, option: int):
+        self.replies += bytes((IAC, verb, option))
+
+    def _negotiate(self, verb: int, option: int):
+        """按选项支持情况应答协商请求（只在状态变化时应答，避免协商循环）"""
+        if verb == WILL:
+            if option in self.accept_remote:
+                if option not in self.remote_enabled:
+                    self.remote_enabled.add(option)
+                    self._reply(DO, option)
+                    self.events.append({"type": "enabled", "side": "remote", "option": option})
+            else:
+                self._reply(DONT, option)
+        elif verb == WONT:
+            if option in self.remote_enabled:
+                self.remote_enabled.discard(option)
+                self._reply(DONT, option)
+                self.events.append({"type": "disabled", "side": "remote", "option": option})
+        elif verb == DO:
+            if option in self.accept_local:
+                if option not in self.local_enabled:
+                    self.local_enabled.add(option)
+                    self._reply(WILL, option)
+                    self.events.append({"type": "enabled", "side": "local", "option": option})
+            else:
+                self._reply(WONT, option)
+        elif verb == DONT:
+            if option in self.local_enabled:
+                self.local_enabled.discard(option)
+                self._reply(WONT, option)
+                self.events.append({"type": "disabled", "side": "local", "option": option})
+
+    def _finish_subnegotiation(self):
+        if self._sb_option is not None:
+            self.events.append({
+                "type": "subnegotiation",
+                "option": self._sb_option,
+                "payload": bytes(self._sb_buf),
+            })
+        self._sb_option = None
+        self._sb_buf.clear()
+
+
+class _MudProtocol(asyncio.Protocol):
+    """asyncio 协议对象，把收到的数据和连接事件转交给 SocketClient"""
+
+    def __init__(self, client: "SocketClient"):
+        self.client = client
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.client._on_connection_made(transport)
+
+    def data_received(self, data: bytes):
+        self.client._on_data(data, self.transport)
+
+    def eof_received(self):
+        # 返回 False 让 transport 自行关闭，随后触发 connection_lost
+        return False
+
+    def connection_lost(self, exc):
+        self.client._on_connection_lost(exc, self.transport)
 
 
 class SocketClient:
@@ -14,16 +374,214 @@ class SocketClient:
     def __init__(self, ip=None, port=None):
         self.ip = ip or config.TARGET_IP
         self.port = port or config.TARGET_PORT
-        self.socket = None
+        self.transport = None
         self.connected = False
 
+        # 后台事件循环（首次连接时启动，重连时复用）
+        self._loop = None
+        self._loop_thread = None
+
+        # 后台读取任务写入、receive() 消费的分帧缓冲区
+        self._framer = LineFramer()
+        self._telnet = self._new_telnet_parser()
+        self._inflater = None  # MCCP2 激活时的 zlib 解压对象
+        self.mccp_stats = {"wire_bytes": 0, "compressed_bytes": 0, "decompressed_bytes": 0}
+        # GMCP/MSDP 结构化数据的最新快照：{"Room.Info": {...}, "MSDP.HEALTH": "100", ...}
+        self.server_data: dict[str, Any] = {}
+        self.telnet_events = deque(maxlen=1000)  # 未消费的 Telnet 结构化事件
+        self._rx_count = 0  # 已收到的数据段计数，用于判断流是否静默
+        self._cond = threading.Condition()
+        self.last_raw = memoryview(b"")  # 最近一次 receive 对应的原始字节
+        self._closing = False
+
+        # 判断“服务器在等待输入”：提示符模式匹配尾行，或收到 Telnet GA/EOR
+        self.prompt_detector = PromptDetector(f"{self.ip}:{self.port}")
+        self._go_ahead = False
+        self._rx_at_send = 0  # 最近一次发送时的 _rx_count
+        # 上次取出数据后是否发送过命令（或新建了连接）；取出时转存到 last_solicited
+        self._sent_since_drain = False
+        self.last_solicited = False  # 最近一次 receive/receive_message 取出的数据是否为响应（而非自发输出）
+
+    # ------------------------------------------------------------------
+    #  事件循环线程
+    # ------------------------------------------------------------------
+
+    def _ensure_loop(self):
+        """启动后台事件循环线程（只启动一次）"""
+        if self._loop is not None:
+            return
+        self._loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(
+            target=self._loop.run_forever,
+            name="SocketClient-IO",
+            daemon=True,
+        )
+        self._loop_thread.start()
+
+    @staticmethod
+    def _new_telnet_parser() -> TelnetParser:
+        accept_remote = {OPT_ECHO, OPT_SGA}
+        if config.TELNET_MCCP2:
+            accept_remote.add(OPT_MCCP2)
+        if config.TELNET_GMCP:
+            accept_remote.add(OPT_GMCP)
+        if config.TELNET_MSDP:
+            accept_remote.add(OPT_MSDP)
+        return TelnetParser(accept_remote=accept_remote)
+
+    def _handle_structured_events(self, events: list[dict], transport) -> dict:
+        """
+        [事件循环线程] 处理 GMCP/MSDP 相关事件。
+
+        选项启用时发送握手（GMCP Core.Hello/Supports.Set，MSDP REPORT），
+        收到子协商时解码为结构化数据，返回本批更新。
+        """
+        updates = {}
+        for event in events:
+            option = event.get("option")
+            if event["type"] == "enabled" and event.get("side") == "remote":
+                if option == OPT_GMCP:
+                    hello = json.dumps({"client": "mudbot", "version": "1.0"})
+                    supports = json.dumps(config.GMCP_SUPPORTS)
+                    transport.write(telnet_subnegotiation(OPT_GMCP, f"Core.Hello {hello}".encode("utf-8")))
+                    transport.write(telnet_subnegotiation(OPT_GMCP, f"Core.Supports.Set {supports}".encode("utf-8")))
+                elif option == OPT_MSDP and config.MSDP_REPORT_VARIABLES:
+                    transport.write(telnet_subnegotiation(
+                        OPT_MSDP, encode_msdp("REPORT", *config.MSDP_REPORT_VARIABLES)
+                    ))
+            elif event["type"] == "subnegotiation":
+                if option == OPT_GMCP:
+                    package, data = decode_gmcp(event["payload"])
+                    if package:
+                        updates[package] = data
+                elif option == OPT_MSDP:
+                    for name, value in decode_msdp(event["payload"]).items():
+                        updates[f"MSDP.{name}"] = value
+        return updates
+
+    def take_server_data(self) -> dict:
+        """返回 GMCP/MSDP 结构化数据最新快照的拷贝"""
+        with self._cond:
+            return dict(self.server_data)
+
+    def _ingest(self, data: bytes, transport) -> bytes:
+        """
+        [事件循环线程] 原始字节 →（MCCP2 解压）→ Telnet 解析 → 数据字节。
+
+        压缩可能在一段数据中间开始（IAC SB MCCP2 IAC SE 之后），
+        也可能在中间结束（zlib 流结束，剩余字节恢复为未压缩流）。
+        """
+        self.mccp_stats["wire_bytes"] += len(data)
+        out = bytearray()
+        while data:
+            if self._inflater is not None:
+                try:
+                    plain = self._inflater.decompress(data)
+                except zlib.error as e:
+                    print(f"{Colors.RED}[系统] MCCP2 解压失败：{e}{Colors.RESET}")
+                    self._inflater = None
+                    transport.close()
+                    break
+                leftover = self._inflater.unused_data
+                self.mccp_stats["compressed_bytes"] += len(data) - len(leftover)
+                self.mccp_stats["decompressed_bytes"] += len(plain)
+                data = b""
+                if self._inflater.eof:
+                    # 服务器结束压缩，剩余字节按未压缩流继续处理
+                    self._inflater = None
+                    data = leftover
+                    print(f"{Colors.WHITE}[系统] MCCP2 压缩已结束{Colors.RESET}")
+            else:
+                plain, data = data, b""
+
+            out += self._telnet.feed(plain)
+            if self._telnet.compress_started:
+                self._inflater = zlib.decompressobj()
+                data = self._telnet.take_tail() + data
+                print(f"{Colors.WHITE}[系统] MCCP2 压缩已启用{Colors.RESET}")
+        return bytes(out)
+
+    def bandwidth_saved(self) -> int:
+        """MCCP2 节省的下行字节数（解压后字节数 - 压缩字节数）"""
+        return self.mccp_stats["decompressed_bytes"] - self.mccp_stats["compressed_bytes"]
+
+    def _on_connection_made(self, transport):
+        """[事件循环线程] 新连接建立：之后只接受该 transport 的回调"""
+        with self._cond:
+            self.transport = transport
+
+    def _on_data(self, data: bytes, transport):
+        """[事件循环线程] 收到数据，解压并剥离 Telnet 序列后写入缓冲区并唤醒等待者"""
+        if transport is not self.transport:
+            return  # 已关闭的旧连接迟到的数据，不能写入新连接的分帧缓冲区
+        text = self._ingest(data, transport)
+        replies = self._telnet.take_replies()
+        if replies:
+            transport.write(replies)
+        events = self._telnet.take_events()
+        updates = self._handle_structured_events(events, transport) if events else None
+        go_ahead = any(e["type"] == "command" and e.get("command") in (GA, EOR) for e in events)
+        with self._cond:
+            if events:
+                self.telnet_events.extend(events)
+            if updates:
+                self.server_data.update(updates)
+            if text:
+                self._framer.feed(text)
+                self._rx_count += 1
+            if go_ahead:
+                self._go_ahead = True
+            if text or go_ahead:
+                self._cond.notify_all()
+
+    def _prompt_ready(self) -> bool:
+        """[持有 _cond] 服务器是否在等待输入"""
+        return self._go_ahead or self.prompt_detector.is_prompt(self._framer.partial)
+
+    def _on_connection_lost(self, exc, transport):
+        """[事件循环线程] 连接断开；旧连接迟到的断开通知不影响当前连接"""
+        with self._cond:
+            if transport is not self.transport:
+                return
+            was_closing = self._closing
+            self.connected = False
+            self.transport = None
+            self._cond.notify_all()
+        if was_closing:
+            return
+        if exc is None:
+            print(f"{Colors.RED}[系统] 服务器关闭了连接{Colors.RESET}")
+        else:
+            print(f"{Colors.RED}[系统] 连接中断：{exc}{Colors.RESET}")
+
+    # ------------------------------------------------------------------
+    #  连接管理
+    # ------------------------------------------------------------------
+
     def connect(self) -> bool:
         """尝试连接到服务器"""
+        self._ensure_loop()
+        with self._cond:
+            self._framer.reset()
+            self._telnet = self._new_telnet_parser()
+            self._inflater = None
+            self.telnet_events.clear()
+            self.server_data = {}
+            self._closing = False
+            self._sent_since_drain = True  # 连接后的欢迎信息、登录提示视为对连接的响应
+
+        async def _open():
+            return await asyncio.wait_for(
+                self._loop.create_connection(lambda: _MudProtocol(self), self.ip, self.port),
+                timeout=config.SOCKET_CONNECT_TIMEOUT,
+            )
+
         try:
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket.settimeout(5.0)
-            self.socket.connect((self.ip, self.port))
-            self.connected = True
+            future = asyncio.run_coroutine_threadsafe(_open(), self._loop)
+            transport, _ = future.result()
+            with self._cond:
+                self.transport = transport
+                self.connected = True
             print(f"{Colors.WHITE}[系统] 已连接到 {self.ip}:{self.port}{Colors.RESET}")
             return True
         except Exception as e:
@@ -33,65 +591,163 @@ class SocketClient:
 
     def disconnect(self):
         """断开连接"""
-        if self.socket:
+        with self._cond:
+            transport = self.transport
+            self._closing = True
+            self.transport = None
+            self.connected = False
+            self._cond.notify_all()
+        if transport is not None and self._loop is not None:
             try:
-                self.socket.close()
-            except Exception:
+                self._loop.call_soon_threadsafe(transport.close)
+            except RuntimeError:
                 pass
-        self.socket = None
-        self.connected = False
         print(f"{Colors.WHITE}[系统] 已断开连接{Colors.RESET}")
+        if self.mccp_stats["compressed_bytes"]:
+            saved = self.bandwidth_saved()
+            total = self.mccp_stats["decompressed_bytes"]
+            print(f"{Colors.WHITE}[系统] MCCP2 累计：压缩 {self.mccp_stats['compressed_bytes']} 字节，"
+                  f"解压后 {total} 字节，节省 {saved} 字节"
+                  f"（{saved * 100 // max(total, 1)}%）{Colors.RESET}")
+
+    # ------------------------------------------------------------------
+    #  收发数据
+    # ------------------------------------------------------------------
 
     def send(self, data: str) -> bool:
         """发送数据，自动添加换行符"""
-        if not self.connected or not self.socket:
+        transport = self.transport
+        if not self.connected or transport is None:
             return False
         try:
-            self.socket.sendall((data + "\n").encode("utf-8"))
+            with self._cond:
+                self._rx_at_send = self._rx_count
+                self._sent_since_drain = True
+            self._loop.call_soon_threadsafe(transport.write, (data + "\n").encode("utf-8"))
             return True
-        except (ConnectionResetError, BrokenPipeError) as e:
-            print(f"{Colors.RED}[系统] 发送错误（连接中断）：{e}{Colors.RESET}")
-            self.disconnect()
-            return False
         except Exception as e:
             print(f"{Colors.RED}[系统] 发送错误：{e}{Colors.RESET}")
             self.disconnect()
             return False
 
-    def receive(self, buffer_size: int = 4096):
+    def receive(self, timeout: float = None):
         """
-        接收数据。
-        返回原始字符串，None 表示连接断开。
+        从缓冲区取出已接收的数据（不直接读 socket）。
+
+        缓冲区为空时最多等待 timeout 秒（默认 config.RECEIVE_TIMEOUT），
+        有数据立即返回。返回的文本保留原有空白排版，包括未以换行结束的
+        提示符尾部；对应的原始字节可通过 self.last_raw 访问。
+        返回原始字符串，空字符串表示暂无数据，None 表示连接断开。
         """
-        if not self.connected or not self.socket:
-            return None
+        if timeout is None:
+            timeout = config.RECEIVE_TIMEOUT
 
-        try:
-            data = self.socket.recv(buffer_size)
-            if not data:
-                print(f"{Colors.RED}[系统] 服务器关闭了连接{Colors.RESET}")
-                self.disconnect()
-                return None
-
-            return data.decode("utf-8", errors="ignore").strip()
-
-        except socket.timeout:
-            return ""
-        except (ConnectionResetError, BrokenPipeError) as e:
-            print(f"{Colors.RED}[系统] 连接中断：{e}{Colors.RESET}")
-            self.disconnect()
-            return None
-        except Exception as e:
-            print(f"{Colors.RED}[系统] Socket 错误：{e}{Colors.RESET}")
-            self.disconnect()
-            return None
+        unterminated = ""
+        with self._cond:
+            if not self._framer.has_data() and self.connected:
+                self._cond.wait_for(lambda: self._framer.has_data() or not self.connected, timeout)
+            if not self._framer.has_data():
+                return None if not self.connected else ""
+            lines, partial, raw = self._framer.drain()
+            self._go_ahead = False
+            self.last_solicited = self._sent_since_drain
+            self._sent_since_drain = False
+
+        # 学习提示符可能写文件，不持有 _cond，以免阻塞 IO 线程的 _on_data
+        if unterminated:
+            self.prompt_detector.observe_unterminated(unterminated)
+        self.last_raw = raw
+        if partial:
+            lines.append(partial)
+        return "\n".join(lines)
+
+    def take_telnet_events(self) -> list[dict]:
+        """取出累积的 Telnet 事件（子协商负载、选项开关、GA/EOR）"""
+        with self._cond:
+            events = list(self.telnet_events)
+            self.telnet_events.clear()
+        return events
+
+    def receive_message(self, timeout: float = None):
+        """
+        聚合模式接收：把分多个 TCP 段到达的输出合并为一条逻辑消息。
+
+        先最多等待 timeout 秒（默认 config.RECEIVE_TIMEOUT）直到有数据，
+        之后持续读取，直到满足以下任一条件：
+        - 流静默超过 config.RECEIVE_IDLE_MS 毫秒
+        - 服务器在等待输入：尾行匹配提示符模式（PromptDetector）或收到 Telnet GA/EOR
+        - 累积字节数达到 config.RECEIVE_MAX_BYTES
+        - 聚合总时长超过 config.RECEIVE_MAX_WAIT 秒
+
+        返回值语义与 receive() 相同。
+        """
+        if timeout is None:
+            timeout = config.RECEIVE_TIMEOUT
+        idle = config.RECEIVE_IDLE_MS / 1000.0
+
+        unterminated = ""
+        with self._cond:
+            if not self._framer.has_data() and self.connected:
+                self._cond.wait_for(lambda: self._framer.has_data() or not self.connected, timeout)
+            if not self._framer.has_data():
+                return None if not self.connected else ""
+
+            deadline = time.monotonic() + config.RECEIVE_MAX_WAIT
+            while self.connected:
+                if self._framer.pending_bytes() >= config.RECEIVE_MAX_BYTES:
+                    break
+                if self._prompt_ready():
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                seen = self._rx_count
+                self._cond.wait_for(
+                    lambda: self._rx_count != seen or self._go_ahead or not self.connected,
+                    min(idle, remaining),
+                )
+                if self._rx_count == seen and not self._go_ahead:
+                    # 静默超过阈值，认为本条消息已结束；未以换行结束的尾行可能是新提示符
+                    unterminated = self._framer.partial
+                    break
+
+            lines, partial, raw = self._framer.drain()
+            self._go_ahead = False
+            self.last_solicited = self._sent_since_drain
+            self._sent_since_drain = False
+
+        # 学习提示符可能写文件，不持有 _cond，以免阻塞 IO 线程的 _on_data
+        if unterminated:
+            self.prompt_detector.observe_unterminated(unterminated)
+        self.last_raw = raw
+        if partial:
+            lines.append(partial)
+        return "\n".join(lines)
+
+    def wait_for_response(self, timeout: float) -> bool:
+        """
+        发送命令后等待服务器开始响应（不消费缓冲区）。
+
+        自上次 send() 以来收到任何数据、或服务器显示提示符时立即返回 True；
+        超时返回 False。完整响应由随后的 receive_message() 聚合读取。
+        """
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self._rx_count != self._rx_at_send or self._go_ahead or not self.connected,
+                timeout,
+            ) and self.connected
 
     @staticmethod
     def clean_ansi(text: str) -> str:
-        """清理 ANSI 转义序列和不可打印字符"""
-        text_clean = re.sub(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])', '', text)
-        text_clean = "".join(
-            ch for ch in text_clean
-            if ch == '\n' or (ord(ch) >= 32 and ord(ch) != 127)
-        )
-        return text_clean
+        """
+        清理 ANSI 转义序列和不可打印字符（保留换行）。
+
+        纯 ASCII 输入走快速路径：预编译的 ANSI 正则 + str.translate 删除表；
+        含中文等非 ASCII 字符时，str.translate 需要逐字符查表，改用单个
+        合并正则一次扫描完成。
+        """
+        if text.isascii():
+            if "\x1b" in text:
+                text = _ANSI_RE.sub("", text)
+            return text.translate(_CONTROL_DELETE_TABLE)
+        return _ANSI_AND_CONTROL_RE.sub("", text)
@@ -0,0 +1,103 @@
+"""
+决策缓存模块
+analyze 的“观察 → 行动”缓存：相同的（规范化后的）服务器输出、相同的任务、
+相同的近期命令序列再次出现时，直接复用之前的决策，不调用 LLM。
+
+键：规范化输出指纹 + 任务 id + 最近几条命令的签名
+策略：
+- LRU 淘汰，最多 config.DECISION_CACHE_SIZE 条
+- 超过 config.DECISION_CACHE_TTL 秒的条目失效
+- 置信度：LLM 对同一个键给出相同命令的次数；达到 config.DECISION_CACHE_MIN_CONFIDENCE
+  才会被复用，给出不同命令时置信度重置
+- 判定任务完成/僵局的决策不缓存
+"""
+import hashlib
+import time
+from collections import OrderedDict
+
+import config
+from pattern_store import normalize
+
+
+# 复用时保留的决策字段（任务完成/僵局、环境类型等判断每次都交给 LLM）
+_CACHED_FIELDS = ("analysis", "next_payload", "expected_result", "commands", "use_skill")
+
+
+class DecisionCache:
+    """LRU + TTL + 置信度的决策缓存"""
+
+    def __init__(self, size: int = None, ttl: float = None):
+        self.size = size if size is not None else config.DECISION_CACHE_SIZE
+        self.ttl = ttl if ttl is not None else config.DECISION_CACHE_TTL
+        self._entries: OrderedDict[bytes, dict] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(output: str, task_id: str, history: list[str]) -> bytes:
+        """规范化输出（数字、空白不敏感）+ 任务 id + 最近几条命令 → 键"""
+        normalized = normalize(output)
+        recent = [h.split(" | Out:", 1)[0] for h in history[-config.DECISION_CACHE_HISTORY:]]
+        h = hashlib.blake2b(digest_size=16)
+        for part in (normalized, task_id, *recent):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h.digest()
+
+    def get(self, key: bytes, now: float = None):
+        """命中且足够可信时返回决策副本，否则返回 None"""
+        now = time.monotonic() if now is None else now
+        entry = self._entries.get(key)
+        if entry is not None and now - entry["created"] > self.ttl:
+            del self._entries[key]
+            entry = None
+        if entry is None or entry["confidence"] < config.DECISION_CACHE_MIN_CONFIDENCE:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        entry["hits"] += 1
+        self.hits += 1
+        return dict(entry["decision"])
+
+    def put(self, key: bytes, decision: dict, now: float = None):
+        """记录 LLM 的决策；判定任务完成或僵局的决策不缓存"""
+        if decision.get("task_completed") or decision.get("task_stuck"):
+            self._entries.pop(key, None)
+            return
+        now = time.monotonic() if now is None else now
+        decision = {k: decision[k] for k in _CACHED_FIELDS if k in decision}
+        entry = self._entries.get(key)
+        if entry is not None and self._same_action(entry["decision"], decision):
+            entry["confidence"] += 1
+            entry["created"] = now
+            self._entries.move_to_end(key)
+            return
+        self._entries[key] = {"decision": decision, "created": now, "confidence": 1, "hits": 0}
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    @staticmethod
+    def _same_action(a: dict, b: dict) -> bool:
+        return (
+            a.get("next_payload") == b.get("next_payload")
+            and a.get("commands") == b.get("commands")
+            and a.get("use_skill") == b.get("use_skill")
+        )
+
+    def format_stats(self) -> str:
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0.0
+        return f"{len(self._entries)} 条，命中 {self.hits}/{total}（{rate:.1%}）"
+
+
+_caches: dict[str, DecisionCache] = {}
+
+
+def get_decision_cache(server_key: str) -> DecisionCache:
+    """获取（并缓存）某个服务器的决策缓存"""
+    cache = _caches.get(server_key)
+    if cache is None:
+        cache = DecisionCache()
+        _caches[server_key] = cache
+    return cache
@@ -0,0 +1,171 @@
+"""
+经验检索模块
+不依赖向量模型的语义检索：从反思者积累的经验和技能（experiences.json）中，
+挑选与当前任务最相关的 top-k 条放进 prompt，经验库增长到上千条时 prompt 大小不变。
+
+- 字符 n-gram（config.EXPERIENCE_NGRAM_RANGE）TF-IDF，哈希到 config.EXPERIENCE_HASH_DIM 维，
+  中英文都无需分词；矩阵以稀疏三元组（行、列、词频）的 NumPy 数组存储
+- 技能的 trigger 与经验/技能的 tags 词频加权；tags 整词出现在查询中时额外加分
+- IDF 在查询时按当前文档频率计算，新条目追加时增量更新，无需重建
+"""
+import re
+import zlib
+
+import numpy as np
+
+import config
+
+
+_SPACES_RE = re.compile(r"\s+")
+
+
+def _ngrams(text: str) -> list[int]:
+    """文本 → 哈希后的字符 n-gram 列号"""
+    text = _SPACES_RE.sub(" ", str(text).lower()).strip()
+    low, high = config.EXPERIENCE_NGRAM_RANGE
+    columns = []
+    for n in range(low, high + 1):
+        for i in range(len(text) - n + 1):
+            gram = text[i:i + n]
+            if gram.strip():
+                columns.append(zlib.crc32(gram.encode("utf-8")) % config.EXPERIENCE_HASH_DIM)
+    return columns
+
+
+def _tags(entry: dict) -> list[str]:
+    return [str(t).lower() for t in entry.get("tags") or [] if str(t).strip()]
+
+
+def experience_text(entry: dict) -> str:
+    return f"{entry.get('summary', '')} {entry.get('lesson', '')}"
+
+
+def skill_text(entry: dict) -> str:
+    return f"{entry.get('name', '')} {entry.get('description', '')}"
+
+
+class NgramIndex:
+    """字符 n-gram TF-IDF 索引，支持增量添加"""
+
+    def __init__(self, text_of):
+        self._text_of = text_of
+        self._reset()
+
+    def _reset(self):
+        self._entries = []
+        self._tags = []
+        self._df = np.zeros(config.EXPERIENCE_HASH_DIM, dtype=np.int32)
+        self._parts = []   # 每个条目的 (列号数组, 词频数组)
+        self._matrix = None  # 拼接后的 (行号, 列号, 词频)，添加条目后失效
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, entry: dict):
+        weights = {}
+        for column in _ngrams(self._text_of(entry)):
+            weights[column] = weights.get(column, 0) + 1
+        boosted = " ".join(_tags(entry))
+        if entry.get("trigger"):
+            boosted += f" {entry['trigger']}"
+        for column in _ngrams(boosted):
+            weights[column] = weights.get(column, 0) + config.EXPERIENCE_FIELD_BOOST
+        columns = np.fromiter(weights.keys(), dtype=np.int64, count=len(weights))
+        self._df[columns] += 1
+        self._parts.append((columns, np.fromiter(weights.values(), dtype=np.float32, count=len(weights))))
+        self._entries.append(entry)
+        self._tags.append(_tags(entry))
+        self._matrix = None
+
+    def sync(self, entries: list):
+        """与列表对齐：列表只在末尾追加时增量添加，否则重建"""
+        n = len(self._entries)
+        if len(entries) < n or (n and entries[n - 1] is not self._entries[n - 1]
+                                and entries[n - 1].get("id") != self._entries[n - 1].get("id")):
+            self._reset()
+            n = 0
+        for entry in entries[n:]:
+            self.add(entry)
+
+    def _triples(self):
+        if self._matrix is None:
+            rows = np.repeat(np.arange(len(self._parts)), [len(c) for c, _ in self._parts])
+            columns = np.concatenate([c for c, _ in self._parts])
+            tf = np.concatenate([v for _, v in self._parts])
+            self._matrix = (rows, columns, tf)
+        return self._matrix
+
+    def scores(self, query: str) -> np.ndarray:
+        """每个条目与 query 的余弦相似度（加上 tag 命中奖励）"""
+        n = len(self._entries)
+        if not n:
+            return np.zeros(0, dtype=np.float32)
+        query_columns = _ngrams(query)
+        if not query_columns:
+            return np.zeros(n, dtype=np.float32)
+        idf = (np.log((1 + n) / (1 + self._df)) + 1).astype(np.float32)
+        q = np.bincount(query_columns, minlength=config.EXPERIENCE_HASH_DIM).astype(np.float32) * idf
+        q /= np.linalg.norm(q) or 1
+        rows, columns, tf = self._triples()
+        weighted = tf * idf[columns]
+        norms = np.sqrt(np.bincount(rows, weights=weighted * weighted, minlength=n))
+        dots = np.bincount(rows, weights=weighted * q[columns], minlength=n)
+        result = (dots / np.maximum(norms, 1e-9)).astype(np.float32)
+        lowered = query.lower()
+        for i, tags in enumerate(self._tags):
+            if tags and any(t in lowered for t in tags):
+                result[i] += config.EXPERIENCE_TAG_BONUS
+        return result
+
+    def search(self, query: str, k: int) -> list:
+        """
+        返回最相关的 k 个条目（降序）；相似度不超过 config.EXPERIENCE_MIN_SCORE 的不返回，
+        全部不相关时返回最新的 k 条。
+        """
+        if len(self._entries) <= k:
+            return list(self._entries)
+        scores = self.scores(query)
+        top = np.argsort(-scores, kind="stable")[:k]
+        top = [int(i) for i in top if scores[i] > config.EXPERIENCE_MIN_SCORE]
+        if not top:
+            return self._entries[-k:]
+        return [self._entries[i] for i in top]
+
+
+class ExperienceIndex:
+    """经验与技能各一个索引"""
+
+    def __init__(self):
+        self.experiences = NgramIndex(experience_text)
+        self.skills = NgramIndex(skill_text)
+
+    def add(self, new_experiences: list = None, new_skills: list = None):
+        for entry in new_experiences or []:
+            self.experiences.add(entry)
+        for entry in new_skills or []:
+            self.skills.add(entry)
+
+    def select(self, experiences: list, skills: list, query: str,
+               k_experiences: int = None, k_skills: int = None) -> tuple[list, list]:
+        """同步状态中的经验/技能列表，返回 (相关经验, 相关技能)"""
+        self.experiences.sync(experiences)
+        self.skills.sync(skills)
+        return (
+            self.experiences.search(query, k_experiences or config.EXPERIENCE_TOP_K),
+            self.skills.search(query, k_skills or config.SKILL_TOP_K),
+        )
+
+    def select_skills(self, skills: list, query: str, k: int = None) -> list:
+        self.skills.sync(skills)
+        return self.skills.search(query, k or config.SKILL_TOP_K)
+
+
+_index = None
+
+
+def get_experience_index() -> ExperienceIndex:
+    """进程内共享的索引（经验库全局唯一，不区分服务器）"""
+    global _index
+    if _index is None:
+        _index = ExperienceIndex()
+    return _index
@@ -3,19 +3,22 @@ LangGraph 图构建模块
 将节点组装为状态图，定义控制流。
 
 架构（知识管理并行化）：
-  planner → observe → start_kb_bg → analyze → act → sync_kb → (循环或回到 planner)
+  planner → observe → start_kb_bg → reflex → analyze → act → sync_kb → (循环或回到 planner)
   
   - start_kb_bg: 在后台线程启动 manage_knowledge，立即返回
+  - reflex: 确定性提示（分页、输入名字等）由规则直接回应，命中时跳过 analyze
   - analyze + act: 与知识管理并行执行
+  - run_skill: analyze 选择了可自动执行的技能时代替 act，不调用 LLM 直接执行技能宏
   - sync_kb: 等待后台知识管理完成，合并结果
 
 规划者只在任务制定/推进时被调用，不参与执行循环。
 """
 from langgraph.graph import StateGraph, END
 
+import config
 from state import AgentState
 from nodes import (
-    observe, analyze, act,
+    observe, reflex, analyze, act, run_skill,
     start_knowledge_update_bg, sync_knowledge_update,
 )
 from planner import planner
@@ -33,12 +36,39 @@ def _route_after_planner(state: AgentState) -> str:
 
 
 def _route_after_observe(state: AgentState) -> str:
-    """observe 之后的路由：连接断开→END，否则→start_kb_bg"""
+    """
+    observe 之后的路由：
+    - 连接断开 → END
+    - 整条输出都是重复广播（未超过跳过上限）→ observe（不调用 LLM，继续等待）
+    - 否则 → start_kb_bg
+    """
     if state.get("should_reconnect", False):
         return "end"
+    if 0 < state.get("idle_skips", 0) <= config.DEDUP_MAX_IDLE_SKIPS:
+        return "observe"
     return "start_kb_bg"
 
 
+def _route_after_reflex(state: AgentState) -> str:
+    """reflex 之后的路由：命中规则 → act（跳过 LLM），否则 → analyze"""
+    if state.get("reflex_rule"):
+        return "act"
+    return "analyze"
+
+
+def _route_after_analyze(state: AgentState) -> str:
+    """
+    analyze 之后的路由：
+    - 选择了可自动执行的技能（且任务未结束）→ run_skill
+    - 否则 → act
+    """
+    if state.get("task_completed", False) or state.get("task_stuck", False):
+        return "act"
+    if state.get("active_skill"):
+        return "run_skill"
+    return "act"
+
+
 def _route_after_act(state: AgentState) -> str:
     """act 之后的路由：连接断开→END，否则→sync_kb"""
     if state.get("should_reconnect", False):
@@ -65,17 +95,19 @@ def build_graph():
     构建并编译 LangGraph 状态图。
     
     架构（知识管理并行化）：
-        planner → observe → start_kb_bg → analyze → act → sync_kb
-                    ↑                                       ↓
-                    └──── 任务未完成 ────────────────────────┘
-                                                            ↓
-                    planner ←── 任务已完成 ──────────────────┘
+        planner → observe → start_kb_bg → reflex → analyze → act → sync_kb
+                    ↑                           └──(命中)───────↗        ↓
+                    └──── 任务未完成 ─────────────────────────────────────┘
+                                                                         ↓
+                    planner ←── 任务已完成 ───────────────────────────────┘
     
     - planner: 制定任务+计划（独立于循环，只在任务切换时调用）
     - observe: 观察服务器输出
     - start_kb_bg: 在后台线程启动知识管理，立即返回
+    - reflex: 规则匹配确定性提示，命中时直接进入 act
     - analyze: 分析并决策（与后台知识管理并行）
     - act: 执行行动（与后台知识管理并行）
+    - run_skill: 直接执行技能宏（代替 act，步骤检查失败时交回 analyze）
     - sync_kb: 等待后台知识管理完成，同步知识库
     
     返回编译后的 CompiledGraph。
@@ -86,8 +118,10 @@ def build_graph():
     graph.add_node("planner", planner)
     graph.add_node("observe", observe)
     graph.add_node("start_kb_bg", start_knowledge_update_bg)
+    graph.add_node("reflex", reflex)
     graph.add_node("analyze", analyze)
     graph.add_node("act", act)
+    graph.add_node("run_skill", run_skill)
     graph.add_node("sync_kb", sync_knowledge_update)
 
     # 入口：规划者先制定任务
@@ -103,21 +137,39 @@ def build_graph():
         },
     )
 
-    # observe → start_kb_bg 或 END
+    # observe → start_kb_bg、observe（重复广播）或 END
     graph.add_conditional_edges(
         "observe",
         _route_after_observe,
         {
             "start_kb_bg": "start_kb_bg",
+            "observe": "observe",
             "end": END,
         },
     )
 
-    # start_kb_bg → analyze（后台知识管理已启动，立即进入分析）
-    graph.add_edge("start_kb_bg", "analyze")
+    # start_kb_bg → reflex（后台知识管理已启动，立即进入反射规则匹配）
+    graph.add_edge("start_kb_bg", "reflex")
+
+    # reflex → act（命中规则，跳过 LLM）或 analyze
+    graph.add_conditional_edges(
+        "reflex",
+        _route_after_reflex,
+        {
+            "act": "act",
+            "analyze": "analyze",
+        },
+    )
 
-    # analyze → act
-    graph.add_edge("analyze", "act")
+    # analyze → act 或 run_skill
+    graph.add_conditional_edges(
+        "analyze",
+        _route_after_analyze,
+        {
+            "act": "act",
+            "run_skill": "run_skill",
+        },
+    )
 
     # act → sync_kb 或 END
     graph.add_conditional_edges(
@@ -129,6 +181,16 @@ def build_graph():
         },
     )
 
+    # run_skill → sync_kb 或 END（与 act 相同）
+    graph.add_conditional_edges(
+        "run_skill",
+        _route_after_act,
+        {
+            "sync_kb": "sync_kb",
+            "end": END,
+        },
+    )
+
     # sync_kb → observe（继续循环）或 planner（任务完成）
     graph.add_conditional_edges(
         "sync_kb",
@@ -0,0 +1,150 @@
+"""
+JSON 修复模块
+容错解析 LLM 返回的不规范 JSON，避免因为一个多余的逗号或被截断的括号就重发整个 prompt。
+
+修复步骤（先直接解析原文，每步之后都尝试解析）：
+1. 去掉 Markdown 代码块标记（```json ... ```）和 JSON 之外的前后文字（字符串值中的 ``` 不受影响）
+2. 删除 } 和 ] 之前多余的逗号
+3. 补全被截断的字符串和括号（丢弃末尾不完整的键值对）
+"""
+import json
+import re
+
+
+_FENCE_RE = re.compile(r"```(?:json|JSON)?")
+_DANGLING_KEY_RE = re.compile(r'([{,])\s*"(?:[^"\\]|\\.)*"\s*:?\s*$')
+
+
+class JsonRepairError(ValueError):
+    """无法修复的 JSON，附带原始文本"""
+
+    def __init__(self, message: str, content: str):
+        super().__init__(message)
+        self.content = content
+
+
+def _strip_wrapping(text: str) -> str:
+    """
+    去掉 JSON 之前的文字和代码块开头标记，以及 JSON 结束之后的内容（含结尾的 ```）。
+    只识别字符串之外的 ```，字符串值中的 ``` 原样保留。
+    """
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    m = _FENCE_RE.search(text)
+    if m and (not starts or m.start() < min(starts)):
+        text = text[m.end():]
+        starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if starts:
+        text = text[min(starts):]
+    return text[:_json_end(text)].strip()
+
+
+def _json_end(text: str) -> int:
+    """顶层结构闭合处（或字符串之外的第一个 ```）的位置；被截断时返回文本长度"""
+    depth = 0
+    in_string = escape = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif text.startswith("```", i):
+            return i
+        elif ch in "{[":
+            depth += 1
+        elif ch in "}]":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return len(text)
+
+
+def _remove_trailing_commas(text: str) -> str:
+    """删除结构结尾多余的逗号（跳过字符串内部）"""
+    out = []
+    in_string = escape = False
+    for ch in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "}]":
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+        out.append(ch)
+    return "".join(out)
+
+
+def _close_truncated(text: str) -> str:
+    """补全被截断的字符串和括号，丢弃末尾不完整的键值对"""
+    stack = []
+    in_string = escape = False
+    for ch in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+    if in_string:
+        if escape:
+            text = text[:-1]
+        text += '"'
+    text = text.rstrip()
+    # 末尾悬空的逗号，或对象中只有键名没有值的键值对（如 {"a": 1, "b": ）
+    text = re.sub(r",\s*$", "", text)
+    if stack and stack[-1] == "}":
+        text = _DANGLING_KEY_RE.sub(r"\1", text)
+    return text + "".join(reversed(stack))
+
+
+def repair_json(text: str):
+    """
+    容错解析 JSON 文本。
+    依次尝试原文、去掉包装、删除多余逗号、补全截断，全部失败时抛出 JsonRepairError。
+    """
+    if text is None:
+        raise JsonRepairError("空响应", "")
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    candidates = []
+    stripped = _strip_wrapping(text)
+    candidates.append(stripped)
+    no_commas = _remove_trailing_commas(stripped)
+    candidates.append(no_commas)
+    candidates.append(_remove_trailing_commas(_close_truncated(no_commas)))
+    error = None
+    for candidate in candidates:
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError as e:
+            error = e
+    raise JsonRepairError(f"JSON 修复失败: {error}", text)
+
+
+def fill_defaults(result, defaults: dict):
+    """为 dict 结果补全缺失的键（不覆盖已有值）"""
+    if isinstance(result, dict) and defaults:
+        for key, value in defaults.items():
+            result.setdefault(key, value)
+    return result
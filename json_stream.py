@@ -0,0 +1,89 @@
+"""
+流式 JSON 字段解析模块
+增量解析流式输出的 JSON 对象：顶层字段的值一结束（字符串收到结束引号、
+数字/布尔值遇到逗号或右括号、嵌套对象/数组闭合）就立即交出，
+不必等待整个 JSON 生成完毕。
+"""
+import json
+
+
+class JsonFieldExtractor:
+    """顶层 JSON 对象的增量字段提取器"""
+
+    def __init__(self):
+        self.fields: dict = {}   # 已完成的顶层字段
+        self._buf = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._token_start = 0
+        self._expect = "key"     # 顶层状态：key → colon → value → comma → key ...
+        self._key = None
+
+    def feed(self, chunk: str) -> list[tuple[str, object]]:
+        """输入一段新文本，返回本次新完成的 (字段名, 值) 列表"""
+        self._buf += chunk
+        done = []
+        buf = self._buf
+        for i in range(self._pos, len(buf)):
+            ch = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._end_token(buf[self._token_start:i + 1], done)
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                if self._depth == 1:
+                    self._token_start = i
+            elif ch in "{[":
+                self._depth += 1
+                if self._depth == 2 and self._expect == "value":
+                    self._token_start = i
+                    self._expect = "nested"
+            elif ch in "}]":
+                if self._depth == 1 and self._expect == "scalar":
+                    self._end_token(buf[self._token_start:i], done)
+                self._depth -= 1
+                if self._depth == 1 and self._expect == "nested":
+                    self._expect = "value"
+                    self._end_token(buf[self._token_start:i + 1], done)
+            elif self._depth == 1:
+                if ch == ":" and self._expect == "colon":
+                    self._expect = "value"
+                elif ch == ",":
+                    if self._expect == "scalar":
+                        self._end_token(buf[self._token_start:i], done)
+                    self._expect = "key"
+                elif self._expect == "value" and not ch.isspace():
+                    self._token_start = i
+                    self._expect = "scalar"
+        self._pos = len(buf)
+        return done
+
+    def _end_token(self, text: str, done: list):
+        """顶层的一个字符串/值结束：要么是字段名，要么是字段值"""
+        try:
+            value = json.loads(text)
+        except json.JSONDecodeError:
+            self._expect = "comma"
+            return
+        if self._expect == "key":
+            self._key = value
+            self._expect = "colon"
+            return
+        if self._key is not None and self._key not in self.fields:
+            self.fields[self._key] = value
+            done.append((self._key, value))
+        self._expect = "comma"
+
+    @property
+    def text(self) -> str:
+        return self._buf
@@ -0,0 +1,140 @@
+"""
+知识库检索模块
+基于 BM25 的内存倒排索引，按相关度（而不是新旧）为 prompt 挑选知识条目。
+
+- 检索字段：content、keywords、specific_type（知识管理节点写入的“类别”），
+  keywords 与 specific_type 的词频乘以 config.KB_FIELD_BOOST
+- 分词：英文/数字按单词切分并转小写；中文按字切分，同时加入相邻两字的 bigram，
+  无需分词词典即可匹配“钥匙”“铁匠铺”这类词
+- 知识库只追加时增量建索引，整理（合并、删除）后自动重建
+"""
+import math
+import re
+from collections import Counter
+
+import config
+
+
+_WORD_RE = re.compile(r"[a-z0-9_]+|[㐀-䶿一-鿿]+")
+_CJK_RE = re.compile(r"[㐀-䶿一-鿿]")
+
+
+def tokenize(text: str) -> list[str]:
+    """英文单词 + 中文 unigram/bigram"""
+    tokens = []
+    for run in _WORD_RE.findall(str(text).lower()):
+        if _CJK_RE.match(run):
+            tokens.extend(run)
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def _entry_terms(entry) -> Counter:
+    if not isinstance(entry, dict):
+        return Counter(tokenize(entry))
+    terms = Counter(tokenize(entry.get("content", "")))
+    tagged = " ".join(str(k) for k in entry.get("keywords") or [])
+    tagged += " " + str(entry.get("specific_type") or "")
+    for term, count in Counter(tokenize(tagged)).items():
+        terms[term] += count * config.KB_FIELD_BOOST
+    return terms
+
+
+def _entry_text(entry) -> str:
+    return entry.get("content", "") if isinstance(entry, dict) else str(entry)
+
+
+class KnowledgeIndex:
+    """BM25 倒排索引：词 → {文档序号: 词频}"""
+
+    def __init__(self, k1: float = None, b: float = None):
+        self.k1 = k1 if k1 is not None else config.KB_BM25_K1
+        self.b = b if b is not None else config.KB_BM25_B
+        self._clear()
+
+    def _clear(self):
+        self._entries = []
+        self._texts = []
+        self._lengths = []
+        self._postings: dict[str, dict[int, int]] = {}
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, entry):
+        doc_id = len(self._entries)
+        terms = _entry_terms(entry)
+        for term, count in terms.items():
+            self._postings.setdefault(term, {})[doc_id] = count
+        length = sum(terms.values())
+        self._entries.append(entry)
+        self._texts.append(_entry_text(entry))
+        self._lengths.append(length)
+        self._total_length += length
+
+    def sync(self, entries: list):
+        """与知识库对齐：只有新增条目时增量添加，否则重建"""
+        n = len(self._entries)
+        if len(entries) < n or any(_entry_text(e) != t for e, t in zip(entries, self._texts)):
+            self._clear()
+            n = 0
+        for entry in entries[n:]:
+            self.add(entry)
+
+    def scores(self, query: str) -> dict[int, float]:
+        """文档序号 → BM25 分数（只包含命中的文档）"""
+        n = len(self._entries)
+        if not n:
+            return {}
+        avg_length = self._total_length / n or 1
+        result: dict[int, float] = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / avg_length)
+                result[doc_id] = result.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return result
+
+    def search(self, query: str, k: int = None) -> list:
+        """
+        返回与 query 最相关的 k 个条目（按相关度降序）。
+        命中不足 k 个时用最新的条目补足，保证刚学到的知识不会因为措辞不同而缺席。
+        """
+        k = k if k is not None else config.KB_TOP_K
+        scores = self.scores(query)
+        ranked = sorted(scores, key=lambda i: (-scores[i], -i))[:k]
+        if len(ranked) < k:
+            chosen = set(ranked)
+            for doc_id in range(len(self._entries) - 1, -1, -1):
+                if len(ranked) >= k:
+                    break
+                if doc_id not in chosen:
+                    ranked.append(doc_id)
+        return [self._entries[i] for i in ranked]
+
+
+_indexes: dict[str, KnowledgeIndex] = {}
+
+
+def get_kb_index(name: str) -> KnowledgeIndex:
+    """按用途（如聚合知识库、当前阶段知识库）复用索引，避免每轮重新分词"""
+    index = _indexes.get(name)
+    if index is None:
+        index = _indexes[name] = KnowledgeIndex()
+    return index
+
+
+def search_kb(name: str, entries: list, query: str, k: int = None) -> list:
+    """同步索引后检索；条目不多于 k 时原样返回"""
+    k = k if k is not None else config.KB_TOP_K
+    if len(entries) <= k:
+        return list(entries)
+    index = get_kb_index(name)
+    index.sync(entries)
+    return index.search(query, k)
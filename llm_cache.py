@@ -0,0 +1,87 @@
+"""
+LLM 响应缓存模块
+按请求内容寻址的 LLM 响应缓存，持久化到 SQLite，重启后依然有效。
+
+键为 (model, system_prompt, user_content, json_mode) 的 SHA-256；
+只缓存通过 validator 校验的结果，条目数超过上限时按最近使用时间淘汰（LRU）。
+是否使用缓存由调用方按 caller_id 前缀选择（config.LLM_CACHE_CALLERS）。
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import config
+
+
+class LLMResponseCache:
+    """基于 SQLite 的 LLM 响应缓存（线程安全）"""
+
+    def __init__(self, path: str = None, max_entries: int = None):
+        self.path = path or config.LLM_CACHE_FILE
+        self.max_entries = max_entries if max_entries is not None else config.LLM_CACHE_MAX_ENTRIES
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " caller TEXT,"
+                " model TEXT,"
+                " result TEXT NOT NULL,"
+                " created REAL NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON responses (last_used)")
+
+    @staticmethod
+    def key(model: str, system_prompt: str, user_content: str, json_mode: bool) -> str:
+        payload = json.dumps([model, system_prompt, user_content, json_mode], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def enabled_for(caller_id: str) -> bool:
+        """caller_id 是否选择使用缓存"""
+        return any(caller_id.startswith(prefix) for prefix in config.LLM_CACHE_CALLERS)
+
+    def get(self, key: str):
+        """命中时返回缓存的结果（dict 或 str），否则返回 None"""
+        with self._lock:
+            row = self._conn.execute("SELECT result FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            with self._conn:
+                self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, result, caller_id: str = "", model: str = ""):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, caller, model, result, created, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, caller_id, model, json.dumps(result, ensure_ascii=False), now, now),
+            )
+            # 超过上限时淘汰最久未使用的条目
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                " SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {"entries": entries, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
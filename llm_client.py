@@ -1,33 +1,81 @@
 """
 LLM 客户端模块
 封装 DeepSeek API 调用，内置自动重试和 validator 校验。
+
+- AsyncLLMClient: 基于 AsyncOpenAI，共享一个保持长连接的 HTTP 连接池，
+  按模型用信号量限制并发请求数
+- LLMClient: 同步外观，在后台事件循环线程上运行 AsyncLLMClient，
+  现有节点（分析线程、知识管理线程）照常同步调用
 """
+import asyncio
 import json
+import threading
 import time
-from openai import OpenAI
+
+import httpx
+from openai import AsyncOpenAI
+
 import config
+from json_repair import JsonRepairError, repair_json, fill_defaults
+from json_stream import JsonFieldExtractor
+from llm_cache import LLMResponseCache
+from llm_resilience import CircuitBreaker, LatencyTracker, LLMRetryBudgetExceeded, RetryBudget
+from metrics import registry as metrics, caller_label
 
 
-class LLMClient:
-    """DeepSeek LLM 客户端，基于 OpenAI SDK"""
+class AsyncLLMClient:
+    """DeepSeek LLM 异步客户端，基于 AsyncOpenAI"""
 
     def __init__(self, api_key=None, base_url=None, model=None):
         self.api_key = api_key or config.API_KEY
         self.base_url = base_url or config.BASE_URL
         self.model = model or config.MODEL
 
-        self.client = OpenAI(
+        # 所有请求共享一个连接池：保持长连接，避免每次调用重新握手 TLS
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=config.LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=config.LLM_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=config.LLM_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(config.LLM_TIMEOUT, connect=config.LLM_CONNECT_TIMEOUT),
+        )
+        self.client = AsyncOpenAI(
             api_key=self.api_key,
             base_url=self.base_url,
-            timeout=600.0,  # 10 minutes timeout for reasoner models
+            timeout=config.LLM_TIMEOUT,  # 推理模型可能需要数分钟
+            http_client=self.http_client,
         )
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+        # 容错：按端点（模型@地址）的熔断器和延迟统计，备用地址的客户端
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._latencies: dict[str, LatencyTracker] = {}
+        self._retry_budgets: dict[str, RetryBudget] = {}
+        self._fallback_clients: dict[str, AsyncOpenAI] = {}
+        # 按内容寻址的响应缓存（按 caller_id 前缀选择使用，见 config.LLM_CACHE_CALLERS）
+        self.cache = LLMResponseCache() if config.LLM_CACHE_ENABLED else None
+
+    def _semaphore(self, model: str) -> asyncio.Semaphore:
+        """每个模型的并发上限（config.LLM_MODEL_CONCURRENCY，未配置时取默认值）"""
+        sem = self._semaphores.get(model)
+        if sem is None:
+            limit = config.LLM_MODEL_CONCURRENCY.get(model, config.LLM_DEFAULT_CONCURRENCY)
+            sem = asyncio.Semaphore(limit)
+            self._semaphores[model] = sem
+        return sem
 
-    def query(self, system_prompt: str, user_content: str, json_mode: bool = True, model: str = None):
+    async def query(self, system_prompt: str, user_content: str, json_mode: bool = True, model: str = None,
+                    caller_id: str = "Unknown", on_field=None):
         """
         单次调用 LLM，成功返回解析后的结果，失败抛出异常。
+
+        提供 on_field(字段名, 值) 时以流式模式调用：JSON 顶层字段一生成完毕就回调，
+        调用方可以在其余字段（如冗长的 analysis）仍在生成时提前行动。
+        回调在事件循环线程中执行，应尽快返回。
         """
+        model, client, endpoint = self._route(model or self.model, caller_id)
         kwargs = {
-            "model": model or self.model,
+            "model": model,
             "messages": [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_content},
@@ -38,24 +86,145 @@ class LLMClient:
         if json_mode:
             kwargs["response_format"] = {"type": "json_object"}
 
-        response = self.client.chat.completions.create(**kwargs)
-        content = response.choices[0].message.content
+        breaker = self._breaker(endpoint)
+        caller = caller_label(caller_id)
+        started = time.monotonic()
+        try:
+            content, usage = await self._hedged(
+                lambda: self._request(client, kwargs, on_field), endpoint, caller_id,
+            )
+        except Exception:
+            metrics.inc("llm_errors_total", caller)
+            if breaker.record_failure():
+                metrics.inc("llm_breaker_open_total", caller)
+                print(f"[LLM][{caller_id}] {endpoint} 连续失败，熔断 {config.LLM_BREAKER_COOLDOWN} 秒")
+            raise
+        elapsed = time.monotonic() - started
+        breaker.record_success()
+        self._latency(endpoint).add(elapsed)
+        metrics.observe("llm_request_seconds", caller, elapsed)
+        self._record_usage(caller, usage)
 
         if json_mode:
-            return json.loads(content)
+            # 不规范的 JSON 先在本地修复，修复失败抛出 JsonRepairError（附原始输出）
+            return repair_json(content)
         else:
             try:
                 return json.loads(content)
             except json.JSONDecodeError:
                 return content
 
-    def call_with_retry(self, system_prompt: str, user_content: str,
-                        json_mode: bool = True, validator=None,
-                        retry_delay: float = 2.0, model: str = None,
-                        caller_id: str = "Unknown"):
+    def _route(self, model: str, caller_id: str):
+        """
+        选择端点：主端点熔断时切换到 config.LLM_FALLBACKS 中配置的备用模型/地址。
+        返回 (模型名, AsyncOpenAI 客户端, 端点名)。
+        """
+        endpoint = f"{model}@{self.base_url}"
+        fallback = config.LLM_FALLBACKS.get(model)
+        if fallback is None or self._breaker(endpoint).allow():
+            return model, self.client, endpoint
+        metrics.inc("llm_fallback_requests_total", caller_label(caller_id))
+        fb_model = fallback.get("model") or model
+        fb_base_url = fallback.get("base_url") or self.base_url
+        fb_endpoint = f"{fb_model}@{fb_base_url}"
+        client = self._fallback_clients.get(fb_base_url)
+        if client is None:
+            client = AsyncOpenAI(
+                api_key=fallback.get("api_key") or self.api_key,
+                base_url=fb_base_url,
+                timeout=config.LLM_TIMEOUT,
+                http_client=self.http_client,
+            ) if fb_base_url != self.base_url else self.client
+            self._fallback_clients[fb_base_url] = client
+        return fb_model, client, fb_endpoint
+
+    def _breaker(self, endpoint: str) -> CircuitBreaker:
+        breaker = self._breakers.get(endpoint)
+        if breaker is None:
+            breaker = self._breakers.setdefault(endpoint, CircuitBreaker(endpoint))
+        return breaker
+
+    def _latency(self, endpoint: str) -> LatencyTracker:
+        tracker = self._latencies.get(endpoint)
+        if tracker is None:
+            tracker = self._latencies.setdefault(endpoint, LatencyTracker())
+        return tracker
+
+    def _retry_budget(self, caller: str) -> RetryBudget:
+        budget = self._retry_budgets.get(caller)
+        if budget is None:
+            capacity = config.LLM_RETRY_BUDGETS.get(caller, config.LLM_DEFAULT_RETRY_BUDGET)
+            budget = self._retry_budgets.setdefault(caller, RetryBudget(capacity))
+        return budget
+
+    async def _hedged(self, make_request, endpoint: str, caller_id: str):
+        """
+        对冲请求：超过该端点 p95 延迟仍未返回时再发一个相同请求，先成功的结果胜出，
+        另一个被取消。只对 config.LLM_HEDGE_CALLERS 中的调用方启用（按 caller_label 精确匹配，
+        Analyze-Correct 这样的纠正调用不对冲）。
+        """
+        p95 = self._latency(endpoint).p95()
+        if p95 is None or caller_label(caller_id) not in config.LLM_HEDGE_CALLERS:
+            return await make_request()
+
+        tasks = {asyncio.ensure_future(make_request())}
+        done, _ = await asyncio.wait(tasks, timeout=p95)
+        if not done:
+            print(f"[LLM][{caller_id}] 超过 p95 延迟 {p95:.1f} 秒，发出对冲请求")
+            metrics.inc("llm_hedged_requests_total", caller_label(caller_id))
+            tasks.add(asyncio.ensure_future(make_request()))
+        try:
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                if not tasks:
+                    raise next(iter(done)).exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _request(self, client, kwargs: dict, on_field):
+        """发出一次请求（受按模型的并发限制）；返回 (完整内容, usage)"""
+        async with self._semaphore(kwargs["model"]):
+            if on_field is None:
+                response = await client.chat.completions.create(**kwargs)
+                return response.choices[0].message.content, response.usage
+            return await self._stream(client, kwargs, on_field)
+
+    async def _stream(self, client, kwargs: dict, on_field):
+        """流式调用，边接收边解析 JSON 顶层字段；返回 (完整内容, usage)"""
+        kwargs = dict(kwargs, stream=True, stream_options={"include_usage": True})
+        extractor = JsonFieldExtractor()
+        parts = []
+        usage = None
+        stream = await client.chat.completions.create(**kwargs)
+        async for chunk in stream:
+            if chunk.usage is not None:
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            parts.append(delta)
+            for name, value in extractor.feed(delta):
+                on_field(name, value)
+        return "".join(parts), usage
+
+    async def call_with_retry(self, system_prompt: str, user_content: str,
+                              json_mode: bool = True, validator=None,
+                              retry_delay: float = 2.0, model: str = None,
+                              caller_id: str = "Unknown", on_field=None, defaults: dict = None):
         """
         循环调用 LLM 直到成功（通过 validator 校验）。
-        
+
+        不规范的响应按代价从低到高处理：
+        1. 本地修复 JSON（去掉代码块标记、多余逗号，补全截断的括号），用 defaults 补全缺失的键
+        2. 仍无法解析或未通过校验时，发起一次廉价的纠正调用：只发送错误和错误输出，不重发原 prompt
+        3. 纠正失败才退避后重发完整 prompt
+
         Args:
             system_prompt: 系统提示词
             user_content: 用户消息
@@ -64,29 +233,183 @@ class LLMClient:
             retry_delay: 重试间隔（秒）
             model: 可选的模型名称覆盖默认值
             caller_id: 调用者标识，用于日志追踪
-        
+            on_field: 可选的流式字段回调（见 query）；重试时可能对同一字段再次回调
+            defaults: 可选的默认值，JSON 结果缺少的键用它补全后再校验
+
         Returns:
             LLM 返回结果（已通过 validator 校验）
+
+        Raises:
+            LLMRetryBudgetExceeded: 该调用方的重试预算（config.LLM_RETRY_BUDGETS，跨调用共享）已耗尽
         """
+        cache_key = None
+        if self.cache is not None and self.cache.enabled_for(caller_id):
+            cache_key = self.cache.key(model or self.model, system_prompt, user_content, json_mode)
+            cached = self.cache.get(cache_key)
+            if cached is not None and (validator is None or validator(cached)):
+                print(f"[LLM][{caller_id}] 命中响应缓存")
+                metrics.inc("llm_response_cache_hits_total", caller_label(caller_id))
+                return cached
+            metrics.inc("llm_response_cache_misses_total", caller_label(caller_id))
+
+        node = caller_label(caller_id)
+        budget = self._retry_budget(node)
+        attempts = 0
         while True:
             try:
-                result = self.query(system_prompt, user_content, json_mode=json_mode, model=model)
+                try:
+                    result = await self.query(system_prompt, user_content, json_mode=json_mode, model=model,
+                                              caller_id=caller_id, on_field=on_field)
+                    fill_defaults(result, defaults)
+                    error, bad_output = "返回结果未通过验证", None
+                except JsonRepairError as e:
+                    result, error, bad_output = None, str(e), e.content
 
-                if validator:
-                    if validator(result):
-                        return result
-                    else:
-                        print(f"[LLM][{caller_id}] 返回结果未通过验证，{retry_delay}秒后重试...")
-                        time.sleep(retry_delay)
-                        retry_delay = min(retry_delay * 2, 60.0)  # Exponential backoff, max 60s
-                        continue
+                if result is not None and (validator is None or validator(result)):
+                    self._cache_result(cache_key, result, caller_id, model)
+                    return result
 
-                return result
+                metrics.inc("llm_validation_failures_total", node)
+                if bad_output is None:
+                    bad_output = json.dumps(result, ensure_ascii=False)
+                corrected = await self._correct(bad_output, error, defaults, caller_id) if json_mode else None
+                if corrected is not None and (validator is None or validator(corrected)):
+                    print(f"[LLM][{caller_id}] 纠正调用修复了响应")
+                    self._cache_result(cache_key, corrected, caller_id, model)
+                    return corrected
+                error = f"{error}，纠正失败"
 
             except Exception as e:
-                print(f"[LLM][{caller_id}] 调用失败: {e}。{retry_delay}秒后重试...")
-                time.sleep(retry_delay)
-                retry_delay = min(retry_delay * 2, 60.0)  # Exponential backoff, max 60s
+                error = f"调用失败: {e}"
+
+            # 重试预算（按调用方跨调用共享）耗尽时放弃，由调用方决定如何降级
+            attempts += 1
+            if not budget.try_spend():
+                metrics.inc("llm_retry_budget_exhausted_total", node)
+                raise LLMRetryBudgetExceeded(caller_id, attempts, error)
+            metrics.inc("llm_retries_total", node)
+            print(f"[LLM][{caller_id}] {error}。{retry_delay}秒后重试...")
+            await asyncio.sleep(retry_delay)
+            retry_delay = min(retry_delay * 2, 60.0)  # Exponential backoff, max 60s
+
+    async def _correct(self, bad_output: str, error: str, defaults: dict, caller_id: str):
+        """
+        廉价的纠正调用：只把错误和错误输出发回（用对话模型），请它输出修正后的 JSON。
+        失败时返回 None。
+        """
+        system_prompt = f"""\
+你是 JSON 修复器。下面的输出本应是一个 JSON 对象，但出现了错误：{error}
+请在不改变原意的前提下输出修正后的完整 JSON 对象，不要输出任何其他内容。"""
+        try:
+            result = await self.query(
+                system_prompt, bad_output[:config.LLM_CORRECTION_MAX_CHARS],
+                json_mode=True, model=config.MODEL, caller_id=f"{caller_id.split('[', 1)[0]}-Correct",
+            )
+        except Exception as e:
+            print(f"[LLM][{caller_id}] 纠正调用失败: {e}")
+            return None
+        return fill_defaults(result, defaults)
+
+    async def aclose(self):
+        await self.client.close()
+
+    @staticmethod
+    def _record_usage(caller: str, usage):
+        """
+        记录一次调用的 token 用量。
+        缓存命中 token：DeepSeek 为 usage.prompt_cache_hit_tokens，OpenAI 兼容接口为
+        usage.prompt_tokens_details.cached_tokens。
+        """
+        metrics.inc("llm_calls_total", caller)
+        if usage is None:
+            return
+        cached = getattr(usage, "prompt_cache_hit_tokens", None)
+        if cached is None:
+            details = getattr(usage, "prompt_tokens_details", None)
+            cached = getattr(details, "cached_tokens", None) if details is not None else None
+        metrics.inc("llm_prompt_tokens_total", caller, usage.prompt_tokens or 0)
+        metrics.inc("llm_cached_tokens_total", caller, cached or 0)
+        metrics.inc("llm_completion_tokens_total", caller, usage.completion_tokens or 0)
+
+    @staticmethod
+    def format_usage() -> str:
+        """各调用方的调用次数、prompt token 和上下文缓存命中率"""
+        parts = []
+        for caller in metrics.callers():
+            calls = metrics.counter("llm_calls_total", caller)
+            if not calls:
+                continue
+            prompt = metrics.counter("llm_prompt_tokens_total", caller)
+            cached = metrics.counter("llm_cached_tokens_total", caller)
+            rate = cached / prompt if prompt else 0.0
+            parts.append(
+                f"{caller}: {calls:.0f}次, prompt {prompt:.0f} (缓存命中 {cached:.0f}, {rate:.1%}), "
+                f"completion {metrics.counter('llm_completion_tokens_total', caller):.0f}"
+            )
+        return "; ".join(parts) or "无"
+
+    def _cache_result(self, cache_key, result, caller_id: str, model: str):
+        if cache_key is None:
+            return
+        try:
+            self.cache.put(cache_key, result, caller_id=caller_id, model=model or self.model)
+        except Exception as e:
+            print(f"[LLM][{caller_id}] 写入响应缓存失败: {e}")
+
+
+class LLMClient:
+    """
+    DeepSeek LLM 同步客户端。
+
+    AsyncLLMClient 的同步外观：协程提交到后台事件循环线程执行，调用线程阻塞等待结果。
+    多个线程同时调用时共享同一个连接池和按模型的并发限制，而不是各自占用连接。
+    """
+
+    def __init__(self, api_key=None, base_url=None, model=None):
+        self._loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(
+            target=self._loop.run_forever,
+            name="LLMClient-IO",
+            daemon=True,
+        )
+        self._loop_thread.start()
+        self.async_client = AsyncLLMClient(api_key=api_key, base_url=base_url, model=model)
+
+        self.api_key = self.async_client.api_key
+        self.base_url = self.async_client.base_url
+        self.model = self.async_client.model
+        self.cache = self.async_client.cache
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def query(self, system_prompt: str, user_content: str, json_mode: bool = True, model: str = None,
+              caller_id: str = "Unknown", on_field=None):
+        """单次调用 LLM，成功返回解析后的结果，失败抛出异常。参数同 AsyncLLMClient.query。"""
+        return self._run(self.async_client.query(
+            system_prompt, user_content, json_mode=json_mode, model=model, caller_id=caller_id,
+            on_field=on_field,
+        ))
+
+    def call_with_retry(self, system_prompt: str, user_content: str,
+                        json_mode: bool = True, validator=None,
+                        retry_delay: float = 2.0, model: str = None,
+                        caller_id: str = "Unknown", on_field=None, defaults: dict = None):
+        """循环调用 LLM 直到成功（通过 validator 校验），参数同 AsyncLLMClient.call_with_retry。"""
+        return self._run(self.async_client.call_with_retry(
+            system_prompt, user_content,
+            json_mode=json_mode, validator=validator,
+            retry_delay=retry_delay, model=model, caller_id=caller_id, on_field=on_field,
+            defaults=defaults,
+        ))
+
+    def format_usage(self) -> str:
+        return self.async_client.format_usage()
+
+    def close(self):
+        """关闭连接池并停止后台事件循环"""
+        self._run(self.async_client.aclose())
+        self._loop.call_soon_threadsafe(self._loop.stop)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,112 @@
+"""
+LLM 容错模块
+服务商变慢或故障时，不让整个状态图卡在一次 LLM 调用上：
+
+- LatencyTracker: 按端点记录最近的请求延迟，给出 p95，用于决定何时发出对冲请求
+- CircuitBreaker: 按端点的熔断器，连续失败后在冷却期内切换到备用模型/地址
+- RetryBudget: 按调用方的重试预算（令牌桶），跨多次调用共享，故障期间很快停止重试
+- LLMRetryBudgetExceeded: 调用方的重试预算（config.LLM_RETRY_BUDGETS）耗尽时抛出
+"""
+import threading
+import time
+from collections import deque
+
+import config
+
+
+class LLMRetryBudgetExceeded(RuntimeError):
+    """调用方的重试预算已耗尽，本次 call_with_retry 放弃"""
+
+    def __init__(self, caller_id: str, attempts: int, last_error: str):
+        super().__init__(f"[{caller_id}] 尝试 {attempts} 次仍失败（{last_error}）")
+        self.caller_id = caller_id
+        self.attempts = attempts
+        self.last_error = last_error
+
+
+class RetryBudget:
+    """
+    重试预算（令牌桶）：最多 capacity 次重试，每 config.LLM_RETRY_BUDGET_WINDOW 秒匀速恢复满。
+    同一调用方的所有调用共享一个预算：服务商持续故障时，第一次调用用完预算后，
+    后续调用失败一次就放弃，而不是每次都退避重试到底。
+    """
+
+    def __init__(self, capacity: int, window: float = None):
+        self.capacity = capacity
+        self.window = window or config.LLM_RETRY_BUDGET_WINDOW
+        self.tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_spend(self) -> bool:
+        """消耗一次重试；预算不足时返回 False"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.capacity / self.window)
+            self._updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class LatencyTracker:
+    """最近若干次成功请求的延迟窗口"""
+
+    def __init__(self, window: int = None):
+        self._samples = deque(maxlen=window or config.LLM_LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def p95(self):
+        """样本不足 config.LLM_HEDGE_MIN_SAMPLES 时返回 None"""
+        with self._lock:
+            if len(self._samples) < config.LLM_HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+class CircuitBreaker:
+    """
+    熔断器：连续失败 config.LLM_BREAKER_FAILURES 次后打开，
+    冷却 config.LLM_BREAKER_COOLDOWN 秒后半开，放行一次试探请求；成功则关闭。
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= config.LLM_BREAKER_COOLDOWN:
+                self.opened_at = time.monotonic()  # 半开：放行一次，失败则继续冷却
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self) -> bool:
+        """记录一次失败，返回熔断器是否因此打开"""
+        with self._lock:
+            self.failures += 1
+            if self.failures >= config.LLM_BREAKER_FAILURES and self.opened_at is None:
+                self.opened_at = time.monotonic()
+                return True
+            if self.opened_at is not None:
+                self.opened_at = time.monotonic()
+            return False
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
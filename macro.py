@@ -0,0 +1,155 @@
+"""
+技能宏模块
+把反思者生成的技能（experiences.json 中的 skills）编译为可直接执行的宏脚本，
+不经过 LLM，直接通过 SocketClient 按节奏逐步发送并检查每一步的响应。
+
+脚本来源为技能的 script 字段：[{"send": 命令, "expect": 预期关键字/正则, "fail": 失败关键字/正则}]。
+steps 是给 LLM 看的自由文本（常含条件分支和举例），不从中提取命令；没有 script 的技能不可自动执行。
+含占位符（<名字>、{密码}、[目标] 等）的命令不可执行，整个技能视为不可编译。
+"""
+import re
+import time
+
+import config
+from pacing import get_pacer
+
+
+_PLACEHOLDER_RE = re.compile(r"<[^>]*>|\{[^}]*\}|\[[^\]]*\]|\bxxx\b", re.IGNORECASE)
+
+
+def matches_expectation(expect: str, response: str) -> bool:
+    """响应是否符合预期：expect 为空时总是符合；按正则匹配，无效正则退化为子串匹配"""
+    if not expect:
+        return True
+    if not response:
+        return False
+    try:
+        return re.search(expect, response) is not None
+    except re.error:
+        return expect in response
+
+
+class Macro:
+    """编译后的技能宏：一组 {send, expect, fail} 步骤"""
+
+    def __init__(self, name: str, steps: list[dict]):
+        self.name = name
+        self.steps = steps
+
+    @classmethod
+    def compile(cls, skill: dict) -> "Macro":
+        """
+        编译技能为宏。
+        技能没有 script 或命令含占位符时抛出 ValueError（附原因）。
+        """
+        name = skill.get("name", "?")
+        script = skill.get("script")
+        if not isinstance(script, list) or not script:
+            raise ValueError("技能没有 script 字段")
+        steps = []
+        for item in script:
+            if isinstance(item, str):
+                item = {"send": item}
+            if not isinstance(item, dict) or not isinstance(item.get("send"), str):
+                raise ValueError(f"无效的脚本步骤: {item!r}")
+            steps.append({
+                "send": item["send"].strip(),
+                "expect": str(item.get("expect") or ""),
+                "fail": str(item.get("fail") or ""),
+            })
+
+        if not steps:
+            raise ValueError("技能没有步骤")
+        for step in steps:
+            if _PLACEHOLDER_RE.search(step["send"]):
+                raise ValueError(f"命令含占位符: {step['send']}")
+        return cls(name, steps)
+
+    @staticmethod
+    def _failed(step: dict, response: str) -> str:
+        """检查一步的响应，返回失败原因；通过时返回空字符串"""
+        if step["fail"] and matches_expectation(step["fail"], response):
+            return f"响应命中失败模式 {step['fail']}"
+        for pattern in config.MACRO_FAIL_PATTERNS:
+            if re.search(pattern, response, re.MULTILINE):
+                return f"响应命中通用失败模式 {pattern}"
+        if not matches_expectation(step["expect"], response):
+            return f"响应不含预期内容 {step['expect']}"
+        return ""
+
+    def run(self, client) -> dict:
+        """
+        在连接上逐步执行宏。
+
+        Returns:
+            {"ok": 是否全部通过, "disconnected": 是否断开连接,
+             "history": ["In: 命令 | Out: 响应..."], "transcript": 原始响应拼接,
+             "failed_step": 失败步骤序号（从1开始，成功为0）, "reason": 失败原因}
+        """
+        pacer = get_pacer(f"{client.ip}:{client.port}")
+        history = []
+        transcript = []
+        for i, step in enumerate(self.steps, 1):
+            pacer.before_send()
+            if not client.send(step["send"]):
+                return self._result(False, history, transcript, i, "发送失败", disconnected=True)
+            sent_at = time.monotonic()
+            responded = client.wait_for_response(pacer.wait_budget(step["send"]))
+            pacer.record(step["send"], time.monotonic() - sent_at, responded)
+
+            # 预算内未开始响应时再多等一会儿，宏需要读到响应才能检查
+            response = client.receive_message(timeout=0 if responded else config.MACRO_STEP_TIMEOUT)
+            if response is None:
+                return self._result(False, history, transcript, i, "连接断开", disconnected=True)
+            transcript.append(response)
+            clean = client.clean_ansi(response).strip("\n")
+            history.append(f"In: {step['send']} | Out: {clean[:50]}...")
+
+            reason = self._failed(step, clean)
+            if reason:
+                return self._result(False, history, transcript, i, reason)
+        return self._result(True, history, transcript, 0, "")
+
+    @staticmethod
+    def _result(ok, history, transcript, failed_step, reason, disconnected=False) -> dict:
+        return {
+            "ok": ok,
+            "disconnected": disconnected,
+            "history": history,
+            "transcript": "\n".join(t for t in transcript if t),
+            "failed_step": failed_step,
+            "reason": reason,
+        }
+
+
+_macros: dict[str, Macro] = {}
+_uncompilable: dict[str, str] = {}
+
+
+def _skill_key(skill: dict) -> str:
+    return skill.get("id") or skill.get("name", "")
+
+
+def get_macro(skill: dict):
+    """获取（并缓存）技能编译后的宏；不可编译时返回 None"""
+    key = _skill_key(skill)
+    macro = _macros.get(key)
+    if macro is not None or key in _uncompilable:
+        return macro
+    try:
+        macro = Macro.compile(skill)
+    except ValueError as e:
+        _uncompilable[key] = str(e)
+        return None
+    _macros[key] = macro
+    return macro
+
+
+def find_skill(skills: list[dict], name: str):
+    """按名称（或 id）查找技能"""
+    if not name:
+        return None
+    for skill in skills:
+        if skill.get("name") == name or skill.get("id") == name:
+            return skill
+    return None
@@ -0,0 +1,163 @@
+"""
+指标模块
+进程内的指标注册表：按调用方统计 LLM 的 token 用量、延迟分布、重试和校验失败次数。
+
+- 定期把快照写入 config.METRICS_DIR（metrics.json 为最新快照，history.jsonl 逐次追加）
+- 可选地在本地端口提供 Prometheus 文本格式的 /metrics 接口（config.METRICS_HTTP_PORT）
+
+调用方标签取 caller_id 中 "[" 之前的部分（Analyze[T1] → Analyze），避免按任务号无限增长。
+"""
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import config
+
+
+def caller_label(caller_id: str) -> str:
+    return caller_id.split("[", 1)[0]
+
+
+class Histogram:
+    """累积分桶直方图（Prometheus 语义：每个桶统计 <= 上界的样本数）"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "buckets": {str(b): c for b, c in zip(self.buckets, self.counts)},
+        }
+
+
+class MetricsRegistry:
+    """线程安全的计数器与直方图注册表：指标名 → 调用方 → 值"""
+
+    def __init__(self):
+        self._counters: dict[str, dict[str, float]] = {}
+        self._histograms: dict[str, dict[str, Histogram]] = {}
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    def inc(self, name: str, caller: str, value: float = 1):
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[caller] = series.get(caller, 0) + value
+
+    def observe(self, name: str, caller: str, value: float):
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            hist = series.get(caller)
+            if hist is None:
+                hist = series[caller] = Histogram(config.METRICS_LATENCY_BUCKETS)
+            hist.observe(value)
+
+    def counter(self, name: str, caller: str) -> float:
+        with self._lock:
+            return self._counters.get(name, {}).get(caller, 0)
+
+    def callers(self) -> list[str]:
+        with self._lock:
+            names = set()
+            for series in self._counters.values():
+                names.update(series)
+            return sorted(names)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "uptime": round(time.time() - self.started_at, 1),
+                "counters": {name: dict(series) for name, series in self._counters.items()},
+                "histograms": {
+                    name: {caller: h.snapshot() for caller, h in series.items()}
+                    for name, series in self._histograms.items()
+                },
+            }
+
+    def to_prometheus(self) -> str:
+        """Prometheus 文本格式"""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                for caller, value in sorted(series.items()):
+                    lines.append(f'{name}{{caller="{caller}"}} {value}')
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# TYPE {name} histogram")
+                for caller, h in sorted(series.items()):
+                    for bound, count in zip(h.buckets, h.counts):
+                        lines.append(f'{name}_bucket{{caller="{caller}",le="{bound}"}} {count}')
+                    lines.append(f'{name}_bucket{{caller="{caller}",le="+Inf"}} {h.count}')
+                    lines.append(f'{name}_sum{{caller="{caller}"}} {h.sum}')
+                    lines.append(f'{name}_count{{caller="{caller}"}} {h.count}')
+        return "\n".join(lines) + "\n"
+
+    def dump(self, directory: str = None):
+        """写入最新快照，并追加到历史记录"""
+        directory = directory or config.METRICS_DIR
+        snapshot = self.snapshot()
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, "metrics.json"), "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, ensure_ascii=False, indent=2)
+            with open(os.path.join(directory, "history.jsonl"), "a", encoding="utf-8") as f:
+                f.write(json.dumps(snapshot, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"写入指标失败: {e}")
+
+
+registry = MetricsRegistry()
+
+_started = False
+
+
+def _dump_loop(interval: float):
+    while True:
+        time.sleep(interval)
+        registry.dump()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") not in ("", "/metrics"):
+            self.send_error(404)
+            return
+        body = registry.to_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # 不把每次抓取写到控制台
+
+
+def start():
+    """启动定期写入线程，以及（配置了端口时）本地 /metrics HTTP 接口；重复调用无效"""
+    global _started
+    if _started:
+        return
+    _started = True
+    threading.Thread(
+        target=_dump_loop, args=(config.METRICS_DUMP_INTERVAL,), name="Metrics-Dump", daemon=True,
+    ).start()
+    if config.METRICS_HTTP_PORT:
+        server = ThreadingHTTPServer(("127.0.0.1", config.METRICS_HTTP_PORT), _MetricsHandler)
+        threading.Thread(target=server.serve_forever, name="Metrics-HTTP", daemon=True).start()
+        print(f"[指标] Prometheus 接口: http://127.0.0.1:{config.METRICS_HTTP_PORT}/metrics")
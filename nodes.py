@@ -5,11 +5,20 @@ LangGraph 图节点模块
 import os
 import time
 import json
-import re
+import threading
 from concurrent.futures import ThreadPoolExecutor, Future
 
 import config
 from config import Colors
+from decision_cache import get_decision_cache
+from experience_index import get_experience_index
+from kb_index import search_kb
+from llm_resilience import LLMRetryBudgetExceeded
+from macro import get_macro, find_skill, matches_expectation
+from output_filters import get_pipeline, get_deduplicator
+from pacing import get_pacer
+from prompt_builder import PromptBuilder, token_budget, ROLE, SKILLS, PHASE, KNOWLEDGE, HISTORY, LATEST
+from reflex import get_reflex
 from state import AgentState
 
 
@@ -133,6 +142,41 @@ def get_aggregated_kb(current_phase: int, current_kb: list[dict]) -> list[dict]:
     return all_kb
 
 
+def _format_server_data(server_data: dict, limit: int = 2000) -> str:
+    """格式化 GMCP/MSDP 结构化数据，供 prompt 使用"""
+    if not server_data:
+        return ""
+    text = json.dumps(server_data, ensure_ascii=False)
+    if len(text) > limit:
+        text = text[:limit] + "...(截断)"
+    return text
+
+
+def _structured_kb_entries(server_data: dict) -> list[dict]:
+    """
+    从 GMCP/MSDP 结构化数据直接生成知识条目，无需 LLM 从文本中提取。
+    目前处理房间信息（GMCP Room.Info / MSDP ROOM）；状态数值变化频繁，不入库。
+    """
+    entries = []
+    room = server_data.get("Room.Info") or server_data.get("MSDP.ROOM")
+    if isinstance(room, dict):
+        name = room.get("name") or room.get("NAME")
+        area = room.get("area") or room.get("zone") or room.get("AREA")
+        exits = room.get("exits") or room.get("EXITS")
+        if name:
+            if isinstance(exits, dict):
+                exits = list(exits.keys())
+            exits_str = "、".join(str(e) for e in exits) if isinstance(exits, list) and exits else "无"
+            content = f"房间「{name}」" + (f"（区域：{area}）" if area else "") + f"，出口：{exits_str}"
+            entries.append({
+                "content": content,
+                "category": "input_triggered",
+                "keywords": [str(name)] + ([str(area)] if area else []),
+                "specific_type": "房间",
+            })
+    return entries
+
+
 # ============================================================
 #  图节点
 # ============================================================
@@ -141,16 +185,26 @@ def observe(state: AgentState) -> dict:
     """
     观察节点：从 Socket 接收服务器输出。
     
-    如果连接断开（receive 返回 None），设置 should_reconnect=True。
+    使用聚合模式接收，分多个 TCP 段到达的长输出（房间描述、帮助页）
+    合并为一条逻辑消息，只触发一次分析。
+    如果整条消息都是窗口内重复的广播，递增 idle_skips，路由回 observe 继续等待。
+    如果连接断开（receive_message 返回 None），设置 should_reconnect=True。
     """
     client = state["client"]
+    pending_output = state.get("pending_output", "")
 
-    server_output = client.receive()
+    # act 流水线中已读取的响应与本次输出合并为一条消息
+    server_output = client.receive_message(timeout=0 if pending_output else None)
+    if pending_output and server_output is not None:
+        server_output = f"{pending_output}\n{server_output}" if server_output else pending_output
 
     if server_output is None:
         return {
             "server_output": "",
             "server_output_clean": "",
+            "server_data": {},
+            "idle_skips": 0,
+            "pending_output": "",
             "should_reconnect": True,
         }
 
@@ -158,50 +212,97 @@ def observe(state: AgentState) -> dict:
         log_colored("服务器", server_output)
 
     server_output_clean = client.clean_ansi(server_output)
-    # Filter out specific compiler warnings
-    # Example: 编译时段错误：/cmds/usr/inventory.c line 32: Warning: Unu...
-    server_output_clean = re.sub(r'(?m)^.*?编译时段错误.*line \d+: Warning: Unu.*$', '', server_output_clean)
-
-    # Filter out garbage characters (like ^X^_'VF*Z) which are likely Telnet negotiation artifacts
-    # Matches lines containing VF*Z or similar short garbage
-    server_output_clean = re.sub(r'(?m)^.*VF\*Z.*$', '', server_output_clean)
-    
-    server_output_clean = server_output_clean.strip()
+    # 按服务器配置的过滤器链删除噪音行（编译器警告、频道闲聊等）
+    filters = get_pipeline(f"{client.ip}:{client.port}")
+    server_output_clean = filters.apply(server_output_clean)
+    if filters.messages % config.FILTER_STATS_INTERVAL == 0:
+        log_colored("过滤器", filters.format_stats())
+
+    server_output_clean = server_output_clean.strip("\n")
+
+    # 折叠滑动窗口内重复的自发广播（天气、频道、饥饿提示等），不让它们反复进入 prompt；
+    # 是否自发由连接层判断：上次取出数据后没有发送过命令、也没有新建连接
+    idle_skips = state.get("idle_skips", 0)
+    spontaneous = not pending_output and not client.last_solicited
+    dedup = get_deduplicator(f"{client.ip}:{client.port}")
+    server_output_clean, suppressed, all_suppressed = dedup.apply(server_output_clean, spontaneous)
+    if all_suppressed:
+        # 整条消息都是重复广播：不值得一次 LLM 调用，继续观察；
+        # 连续超过上限的那一条交给分析，之后重新计数
+        idle_skips = 1 if idle_skips > config.DEDUP_MAX_IDLE_SKIPS else idle_skips + 1
+        log_task(state.get("current_task", {}).get("id", "?"), "DEDUP", server_output_clean)
+    else:
+        idle_skips = 0
 
     return {
         "server_output": server_output,
         "server_output_clean": server_output_clean,
+        "server_data": client.take_server_data(),
+        "idle_skips": idle_skips,
+        "pending_output": "",
         "should_reconnect": False,
     }
 
 
-def analyze(state: AgentState) -> dict:
+def reflex(state: AgentState) -> dict:
     """
-    分析节点：接收规划者分配的任务，执行分析并决定下一步行动。
-    
-    职责：
-    1. 根据当前任务和服务器输出决定 payload
-    2. 判断当前任务是否已完成，如完成则设置 task_completed=True
-    3. 识别环境类型（阶段1任务）
+    反射节点：observe 之后、analyze 之前。
+
+    对输出的最后一行匹配确定性规则（分页、输入名字、按任意键等），
+    命中时直接给出 payload 并跳过 analyze（不调用 LLM）；未命中时交给 analyze。
     """
-    llm = state["llm"]
+    client = state["client"]
+    matcher = get_reflex(f"{client.ip}:{client.port}")
+    hit = matcher.match(state.get("server_output_clean", ""))
+    if matcher.checks % config.REFLEX_STATS_INTERVAL == 0:
+        log_colored("反射", matcher.format_stats())
+    if hit is None:
+        return {"reflex_rule": ""}
+
+    name, response = hit
+    log_colored("反射", f"规则 [{name}] 命中，直接回应：{response!r}", Colors.CYAN)
+    log_task(state.get("current_task", {}).get("id", "?"), "REFLEX", f"[{name}] {response!r}")
+    return {
+        "reflex_rule": name,
+        "analysis": f"反射规则 [{name}]",
+        "payload": response,
+        # 回应可以是空行（回车），通过 commands 发送
+        "commands": [{"payload": response, "expect": ""}],
+        "active_skill": "",
+    }
+
+
+# analyze 决策中可以安全补全的键（analysis 缺失仍视为无效响应）
+_ANALYZE_DEFAULTS = {
+    "next_payload": "",
+    "expected_result": "",
+    "commands": [],
+    "use_skill": "",
+    "task_completed": False,
+    "task_result": "",
+    "task_stuck": False,
+    "task_stuck_reason": "",
+}
+
+
+def _analyze_prompt(state: AgentState, task_attempts: int) -> str:
+    """构建 analyze 的系统 prompt（知识库检索、经验与技能挑选、按 token 预算裁剪）"""
     server_output_clean = state["server_output_clean"]
+    server_data = state.get("server_data", {})
     current_task = state.get("current_task", {})
-    tasks = list(state.get("tasks", []))
     knowledge_base = state.get("knowledge_base", [])
     history = state.get("history", [])
     phase = state.get("phase", 1)
     phase_name = state.get("phase_name", "未知")
-    environment_type = state.get("environment_type", "unknown")
-    task_attempts = state.get("task_attempts", 0) + 1  # 递增尝试计数
     experiences = state.get("experiences", [])
     skills = state.get("skills", [])
 
-    # 构建知识库字符串（使用聚合后的全量知识）
+    # 构建知识库字符串：从聚合后的全量知识中按与当前任务描述的相关度挑选 top-k；
+    # 不使用服务器输出，保证同一任务内 KNOWLEDGE 片段只随新增知识变化，后面的 HISTORY 仍能命中前缀缓存
     full_kb = get_aggregated_kb(phase, knowledge_base)
     kb_str = ""
     if full_kb:
-        for entry in full_kb[-30:]:  # 增加展示数量
+        for entry in search_kb("aggregated", full_kb, current_task.get("description", "")):
             if isinstance(entry, dict):
                 kb_str += f"- [阶段{entry.get('from_phase', phase)}][{entry.get('category', '?')}] {entry.get('content', '')}\n"
             else:
@@ -213,81 +314,133 @@ def analyze(state: AgentState) -> dict:
     recent_history = history[-config.MAX_HISTORY_ROUNDS:]
     history_str = "\n".join(recent_history)
 
-    # 构建经验与技能上下文
+    # 构建经验与技能上下文：按与当前任务描述的相似度挑选 top-k，经验库再大 prompt 也不变长；
+    # 不使用服务器输出，保证同一任务内 SKILLS 片段不变，不破坏 prompt 的前缀缓存
+    relevant_exps, relevant_skills = get_experience_index().select(
+        experiences, skills, current_task.get("description", ""))
     exp_str = ""
-    if experiences:
-        # 简单策略：只显示最近的 5 条经验，或者提取相关的 (这里简化处理)
-        # TODO: 引入向量检索或关键词匹配
-        recent_exps = experiences[-5:] 
-        exp_str = "参考经验:\n" + "\n".join([f"- {e.get('summary')} ({e.get('lesson')})" for e in recent_exps])
+    if relevant_exps:
+        exp_str = "参考经验:\n" + "\n".join([f"- {e.get('summary')} ({e.get('lesson')})" for e in relevant_exps])
     else:
         exp_str = "暂无相关经验。"
 
     skill_str = ""
-    if skills:
-        skill_str = "可用技能:\n"
-        for s in skills:
-            skill_str += f"- {s.get('name')}: {s.get('description')} (触发条件: {s.get('trigger')})\n  步骤: {', '.join(s.get('steps', []))}\n"
+    if relevant_skills:
+        for s in relevant_skills:
+            runnable = " [可自动执行]" if get_macro(s) is not None else ""
+            skill_str += f"- {s.get('name')}{runnable}: {s.get('description')} (触发条件: {s.get('trigger')}) 步骤: {', '.join(s.get('steps', []))}\n"
     else:
         skill_str = "暂无可用技能。"
 
+    skill_failure = state.get("skill_failure", "")
+    skill_failure_str = f"注意：{skill_failure}，请根据服务器输出自行处理。\n" if skill_failure else ""
+
+    # 结构化数据（GMCP/MSDP）直接给出房间、状态等信息，无需从文本推断
+    server_data_str = ""
+    if server_data:
+        server_data_str = f"服务器结构化数据（GMCP/MSDP，准确可靠，优先于从文本推断）:\n{_format_server_data(server_data)}\n"
+
     # 当前任务信息
     task_desc = current_task.get("description", "无特定任务")
     task_plan = current_task.get("plan", "无特定计划")
     task_id = current_task.get("id", "?")
 
-    system_prompt = f"""\
+    # 片段按稳定性排序（规则 → 技能 → 任务 → 知识库 → 历史 → 最新输出），复用服务商的前缀缓存
+    # 超出模型 token 预算时按优先级裁剪：经验与技能 → 知识库 → 历史 → 最新输出
+    prompt = PromptBuilder(budget=token_budget(config.MODEL))
+    prompt.add(ROLE, f"""\
 你是一个自主智能体，正在通过 Socket 连接与远程服务器交互。
-
-当前阶段: {phase} - {phase_name}
-当前任务 [{task_id}]: {task_desc}
-执行计划: {task_plan}
-
-当前知识库:
-{kb_str}
-
-{exp_str}
-
-{skill_str}
-
-交互历史 (Client -> Server)，也就是你最近和服务器的对话过程记录:
-{history_str}
-
-服务器的最后输出是："{server_output_clean}"
-
-当前任务已尝试 {task_attempts} 轮（上限 {config.MAX_TASK_ATTEMPTS} 轮）。
+下面依次给出可用的经验与技能、当前阶段与任务、知识库、交互历史，最后是服务器的最新输出。
 
 你的任务：
 1. 分析服务器的响应，判断它与当前任务的关系。注意有些输出并非输入的直接响应，可能是服务器的自然输出或者是之前输入的延迟响应，需要仔细辨别。
 2. 根据当前阶段的任务和计划，交互历史和服务器最后输出，利用你掌握的当前知识库的知识，决定下一步应该发送什么命令,预期什么结果。当交互历史显示连续多次预期都不对时，适时调整命令，可以参考帮助系统。
 3. 判断当前任务是否已经完成（有足够信息得出结论）。
 4. 如果你发现经过多轮尝试后任务无法完成或只能部分完成（例如反复尝试同样的命令、陷入循环、或者环境不支持所需操作），请如实汇报，设置 task_stuck 为 true。
+5. 如果接下来几步命令无需根据中间结果调整（例如 look、inventory、score 依次查看），可以在 commands 中按顺序列出（最多 {config.MAX_PIPELINE_COMMANDS} 个，第一个与 next_payload 相同），每个命令给出 expect：预期响应中应出现的关键字或正则。系统会连续发送，某个响应不符合预期时立即停止。不需要时 commands 为空列表。
+6. 如果某个标注 [可自动执行] 的技能的触发条件与当前情况吻合，可以在 use_skill 中给出技能名称，系统会直接执行该技能的全部步骤（此时 next_payload 可为空）。不使用技能时 use_skill 为空字符串。
 
-严格以 JSON 格式输出：
+严格以 JSON 格式、按下面的字段顺序输出（系统在 next_payload 生成后立即发送，不等其余字段）：
 {{
-    "analysis": "你的简要分析...",
+    "use_skill": "要直接执行的技能名称，或空字符串",
     "next_payload": "下一步要发送的具体字符串",
+    "commands": [{{"payload": "命令", "expect": "预期响应中的关键字或正则"}}],
     "expected_result": "简要给出你预期服务器的大致输出结果",
+    "analysis": "你的简要分析...",
     "task_completed": true/false,
     "task_result": "如果任务完成，简要总结结果；否则为空",
     "task_stuck": true/false,
     "task_stuck_reason": "如果陷入僵局，说明原因和已取得的部分成果；否则为空"
-}}
-"""
-
-    user_msg = f"服务器说：{server_output_clean}。根据任务 [{task_id}]，你的下一步行动是什么？"
+}}""")
+    prompt.add(SKILLS, exp_str, priority=1)
+    prompt.add(SKILLS, skill_str, title="可用技能（标注 [可自动执行] 的技能可以通过 use_skill 直接执行）:",
+               priority=1, keep="head")
+    prompt.add(PHASE, f"""\
+当前阶段: {phase} - {phase_name}
+当前任务 [{task_id}]: {task_desc}
+执行计划: {task_plan}""")
+    prompt.add(KNOWLEDGE, kb_str, title="当前知识库（按相关度排序）:", priority=2, keep="head",
+               max_tokens=config.PROMPT_KB_TOKENS)
+    prompt.add(HISTORY, history_str, title="交互历史 (Client -> Server)，也就是你最近和服务器的对话过程记录:",
+               priority=3)
+    prompt.add(LATEST, f'服务器的最后输出是："{server_output_clean}"', priority=4)
+    prompt.add(LATEST, server_data_str)
+    prompt.add(LATEST, skill_failure_str)
+    prompt.add(LATEST, f"当前任务已尝试 {task_attempts} 轮（上限 {config.MAX_TASK_ATTEMPTS} 轮）。")
+    return prompt.build()
 
-    # print("[*] 思考中...")
 
-    def main_logic_validator(res):
-        return isinstance(res, dict) and "analysis" in res
+def analyze(state: AgentState) -> dict:
+    """
+    分析节点：接收规划者分配的任务，执行分析并决定下一步行动。
+    
+    职责：
+    1. 根据当前任务和服务器输出决定 payload
+    2. 判断当前任务是否已完成，如完成则设置 task_completed=True
+    3. 识别环境类型（阶段1任务）
+    """
+    llm = state["llm"]
+    server_output_clean = state["server_output_clean"]
+    current_task = state.get("current_task", {})
+    tasks = list(state.get("tasks", []))
+    history = state.get("history", [])
+    environment_type = state.get("environment_type", "unknown")
+    task_attempts = state.get("task_attempts", 0) + 1  # 递增尝试计数
+    skills = state.get("skills", [])
+    task_id = current_task.get("id", "?")
 
-    decision = llm.call_with_retry(
-        system_prompt, user_msg,
-        json_mode=True,
-        validator=main_logic_validator,
-        caller_id=f"Analyze[{task_id}]"
-    )
+    # 相同输出 + 相同任务 + 相同近期命令已有足够可信的决策时直接复用，不构建 prompt
+    server_key = f"{state['client'].ip}:{state['client'].port}"
+    decision_cache = get_decision_cache(server_key)
+    cache_key = decision_cache.key(server_output_clean, task_id, history)
+    decision = decision_cache.get(cache_key)
+    from_cache = decision is not None
+    early = _EarlySender(state["client"])
+    if from_cache:
+        log_colored("分析", f"命中决策缓存（{decision_cache.format_stats()}）", Colors.CYAN)
+    else:
+        system_prompt = _analyze_prompt(state, task_attempts)
+        user_msg = f"服务器说：{server_output_clean}。根据任务 [{task_id}]，你的下一步行动是什么？"
+
+        def main_logic_validator(res):
+            return isinstance(res, dict) and "analysis" in res
+
+        try:
+            decision = llm.call_with_retry(
+                system_prompt, user_msg,
+                json_mode=True,
+                validator=main_logic_validator,
+                defaults=_ANALYZE_DEFAULTS,
+                caller_id=f"Analyze[{task_id}]",
+                on_field=early.send if config.LLM_STREAM_ANALYZE else None,
+            )
+            decision_cache.put(cache_key, decision)
+        except LLMRetryBudgetExceeded as e:
+            # 服务商故障时不让整个图卡住：本轮不发送命令，下一轮重新观察后再决策
+            log_colored("分析", f"LLM 调用失败，本轮跳过：{e}", Colors.RED)
+            decision = dict(_ANALYZE_DEFAULTS, analysis=f"LLM 调用失败：{e.last_error}")
+            task_attempts -= 1  # LLM 故障不计入任务尝试次数
+        early.wait()
 
     # 解析决策
     analysis = decision.get("analysis", "无分析")
@@ -297,13 +450,29 @@ def analyze(state: AgentState) -> dict:
     env_type = decision.get("environment_type")
     llm_stuck = decision.get("task_stuck", False)
     llm_stuck_reason = decision.get("task_stuck_reason", "")
+    commands = _parse_commands(decision.get("commands"), payload)
+    if commands:
+        payload = commands[0]["payload"]
+    active_skill = ""
+    skill = find_skill(skills, decision.get("use_skill") or "")
+    if skill is not None and get_macro(skill) is not None:
+        active_skill = skill.get("name", "")
+
+    if payload and len(commands) <= 1 and not active_skill and not from_cache:
+        # 同一提示反复得到相同回应时，反射层学习为规则，以后不再调用 LLM
+        if get_reflex(server_key).observe_decision(server_output_clean, payload, state["client"].prompt_detector):
+            log_colored("反射", f"学习到新规则：{payload!r}", Colors.CYAN)
 
     log_colored("分析", f"[{task_id}] (尝试 {task_attempts}/{config.MAX_TASK_ATTEMPTS}) {analysis[:100]}...", Colors.CYAN)
     
     # 记录详细任务日志
     log_task(task_id, "SERVER_OUTPUT", server_output_clean)
-    log_task(task_id, "ANALYSIS", analysis)
+    log_task(task_id, "ANALYSIS", f"(缓存) {analysis}" if from_cache else analysis)
     log_task(task_id, "PAYLOAD", payload)
+    if len(commands) > 1:
+        log_task(task_id, "PIPELINE", json.dumps(commands, ensure_ascii=False))
+    if active_skill:
+        log_task(task_id, "USE_SKILL", active_skill)
     log_task(task_id, "ATTEMPT", f"{task_attempts}/{config.MAX_TASK_ATTEMPTS}")
     if env_type:
         log_task(task_id, "ENV_TYPE", env_type)
@@ -313,6 +482,11 @@ def analyze(state: AgentState) -> dict:
     result = {
         "analysis": analysis,
         "payload": payload,
+        "commands": commands if len(commands) > 1 else [],
+        "active_skill": active_skill,
+        "skill_failure": "",
+        "early_payload": early.payload,
+        "early_sent_at": early.sent_at,
         "task_completed": False,  # 默认不完成
         "task_stuck": False,      # 默认不僵局
         "task_attempts": task_attempts,
@@ -369,6 +543,62 @@ def analyze(state: AgentState) -> dict:
     return result
 
 
+class _EarlySender:
+    """
+    流式分析时提前发送 next_payload：该字段一生成完毕就发送，不等 analysis 等其余字段。
+    每次 analyze 最多提前发送一次；由 act 识别并跳过重复发送。
+    use_skill 在 schema 中位于 next_payload 之前：选择了技能时不提前发送，由 run_skill 执行。
+
+    send 作为 on_field 回调运行在 LLMClient 的事件循环线程上，不能在其中等待节奏控制或写日志，
+    否则会阻塞所有并发的 LLM 请求；实际发送交给单独的线程，analyze 在调用结束后 wait()。
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.payload = ""
+        self.sent_at = 0.0
+        self.skip = False
+        self._thread = None
+
+    def send(self, field: str, value):
+        if field == "use_skill" and value:
+            self.skip = True
+        if field != "next_payload" or self.skip or self._thread is not None or not isinstance(value, str) or not value:
+            return
+        self._thread = threading.Thread(target=self._send, args=(value,), name="EarlySender", daemon=True)
+        self._thread.start()
+
+    def _send(self, value: str):
+        get_pacer(f"{self.client.ip}:{self.client.port}").before_send()
+        log_colored("客户端", f"提前发送：{value}", Colors.GREEN)
+        if self.client.send(value):
+            self.sent_at = time.monotonic()
+            self.payload = value
+
+    def wait(self):
+        """等待提前发送完成（未提前发送时立即返回）"""
+        if self._thread is not None:
+            self._thread.join()
+
+
+def _parse_commands(raw_commands, payload: str) -> list[dict]:
+    """
+    规范化 analyze 返回的 commands 列表：[{"payload": str, "expect": str}, ...]。
+    保证第一个命令与 next_payload 一致，并截断到 config.MAX_PIPELINE_COMMANDS 个。
+    """
+    if not isinstance(raw_commands, list):
+        return []
+    commands = []
+    for item in raw_commands:
+        if isinstance(item, dict) and isinstance(item.get("payload"), str) and item["payload"]:
+            commands.append({"payload": item["payload"], "expect": str(item.get("expect") or "")})
+        elif isinstance(item, str) and item:
+            commands.append({"payload": item, "expect": ""})
+    if commands and payload and commands[0]["payload"] != payload:
+        commands.insert(0, {"payload": payload, "expect": ""})
+    return commands[:config.MAX_PIPELINE_COMMANDS]
+
+
 def manage_knowledge(state: AgentState) -> dict:
     """
     知识管理节点：act 之后执行。
@@ -387,6 +617,26 @@ def manage_knowledge(state: AgentState) -> dict:
     tasks = state.get("tasks", [])
     counter = state.get("kb_consolidation_counter", 0)
     server_output_clean = state.get("server_output_clean", "")
+    server_data = state.get("server_data", {})
+
+    # 结构化数据（GMCP/MSDP）直接入库，不花 token 让 LLM 从文本中提取
+    structured_added = 0
+    for entry in _structured_kb_entries(server_data):
+        if any(isinstance(e, dict) and e.get("content") == entry["content"] for e in knowledge_base):
+            continue
+        knowledge_base.append(entry)
+        structured_added += 1
+        log_knowledge("STRUCTURED", f"[{entry['category']}] {entry['content']}")
+    if structured_added:
+        save_kb(knowledge_base, phase=phase)
+
+    if server_data and not server_output_clean.strip():
+        # 本轮只有结构化数据更新，没有需要 LLM 理解的文本
+        return {
+            "knowledge_base": knowledge_base,
+            "kb_consolidation_counter": counter,
+            "added_count": structured_added,
+        }
 
     if not history and not tasks:
         # 即使没有历史，如果只是为了整理或保存，也应该允许执行（但act后通常有历史）
@@ -404,7 +654,7 @@ def manage_knowledge(state: AgentState) -> dict:
     prev_kb = load_all_previous_kb(phase)
     prev_kb_str = ""
     if prev_kb:
-        for entry in prev_kb[-15:]:
+        for entry in prev_kb:
             prev_kb_str += f"- [阶段{entry.get('from_phase', '?')}][{entry.get('category', '?')}] {entry.get('content', '')}\n"
     else:
         prev_kb_str = "无以前阶段的知识。"
@@ -424,25 +674,14 @@ def manage_knowledge(state: AgentState) -> dict:
     recent_history = history[-config.MAX_HISTORY_ROUNDS:]
     history_str = "\n".join([f"{i+1}. {h}" for i, h in enumerate(recent_history)])
 
-    system_prompt = f"""\
-你是一个知识库管理员。你的职责是为当前阶段管理专门的知识库。
-
-当前阶段: {phase} - {phase_name}
-
-当前阶段的任务:
-{tasks_str}
-
-以前阶段的知识库（参考）:
-{prev_kb_str}
+    server_data_str = _format_server_data(server_data) or "无。"
 
-当前阶段知识库:
-{kb_str}
-
-最近的交互历史:
-{history_str}
-
-服务器最新输出:
-"{server_output_clean}"
+    # 以前阶段知识保留最新的 PROMPT_PREV_KB_TOKENS；整体超出预算时再按优先级裁剪：
+    # 以前阶段知识 → 交互历史 → 当前阶段知识库 → 最新输出
+    prompt = PromptBuilder(budget=token_budget(config.MODEL))
+    prompt.add(ROLE, """\
+你是一个知识库管理员。你的职责是为当前阶段管理专门的知识库。
+下面依次给出当前阶段与任务、知识库、最近的交互历史，最后是服务器的最新输出。
 
 你的任务：
 1. 根据当前阶段的任务，分析知识库建设的重点方向,从而确定新信息的类别。
@@ -454,20 +693,28 @@ def manage_knowledge(state: AgentState) -> dict:
 5. 类别必须是当前阶段任务相关的具体类型。
 6. 已存在于知识库中的重复信息不要再次添加。
 7. 无意义的系统噪音不要记录。
+8. 结构化数据中已经包含的信息（房间、出口、状态数值等）不要再从文本中重复提取。
 
 严格以 JSON 格式输出：
-{{
+{
     "kb_focus": "当前阶段知识库建设的重点方向",
     "reasoning": "你的分析思路...",
     "new_entries": [
-        {{"content": "知识内容...", "category": "input_triggered 或 spontaneous",
-        "keywords": ["关键词1", "关键词2", ...], "类别": "具体类型"}}
+        {"content": "知识内容...", "category": "input_triggered 或 spontaneous",
+        "keywords": ["关键词1", "关键词2", ...], "类别": "具体类型"}
     ],
     
-}}
-
-如果没有需要添加的新知识，new_entries 应为空列表 []。
-"""
+}
+
+如果没有需要添加的新知识，new_entries 应为空列表 []。""")
+    prompt.add(PHASE, f"当前阶段: {phase} - {phase_name}\n\n当前阶段的任务:\n{tasks_str}")
+    prompt.add(KNOWLEDGE, prev_kb_str, title="以前阶段的知识库（参考）:", priority=1,
+               max_tokens=config.PROMPT_PREV_KB_TOKENS)
+    prompt.add(KNOWLEDGE, kb_str, title="当前阶段知识库:", priority=3)
+    prompt.add(HISTORY, history_str, title="最近的交互历史:", priority=2)
+    prompt.add(LATEST, f'"{server_output_clean}"', title="服务器最新输出:", priority=4)
+    prompt.add(LATEST, f"服务器结构化数据（GMCP/MSDP，其中的房间信息已由系统直接入库）:\n{server_data_str}")
+    system_prompt = prompt.build()
 
     user_msg = "请审查交互历史并更新当前阶段的知识库。"
 
@@ -480,6 +727,7 @@ def manage_knowledge(state: AgentState) -> dict:
         system_prompt, user_msg,
         json_mode=True,
         validator=kb_validator,
+        defaults={"kb_focus": "", "reasoning": ""},
         caller_id=f"KnowledgeManager[Phase{phase}]"
     )
 
@@ -523,6 +771,7 @@ def manage_knowledge(state: AgentState) -> dict:
         added_count += 1
 
     counter += 1
+    added_count += structured_added
 
     if added_count > 0:
         save_kb(knowledge_base, phase=phase)
@@ -538,10 +787,14 @@ def manage_knowledge(state: AgentState) -> dict:
     # ------------------------------------------------------------------
     if counter >= config.KB_CONSOLIDATION_INTERVAL:
         log_colored("知识管理", "开始定期整理知识库...", Colors.MAGENTA)
-        knowledge_base = _consolidate_knowledge(llm, knowledge_base, phase, phase_name)
-        save_kb(knowledge_base, phase=phase)
-        counter = 0
-        log_colored("知识管理", "知识库整理完成。", Colors.MAGENTA)
+        try:
+            knowledge_base = _consolidate_knowledge(llm, knowledge_base, phase, phase_name)
+            save_kb(knowledge_base, phase=phase)
+            counter = 0
+            log_colored("知识管理", "知识库整理完成。", Colors.MAGENTA)
+        except LLMRetryBudgetExceeded as e:
+            # 保留本轮新增的知识，下一轮再尝试整理
+            log_colored("知识管理", f"知识库整理失败，稍后重试：{e}", Colors.RED)
 
     return {
         "knowledge_base": knowledge_base,
@@ -613,37 +866,147 @@ def _consolidate_knowledge(llm, knowledge_base, phase, phase_name):
     return knowledge_base
 
 
+def _send_paced(client, payload: str, sent_at: float = None) -> bool:
+    """
+    按节奏控制发送一条命令：遵守速率限制，发送后按该命令动词学习到的延迟
+    等待服务器开始响应（收到数据或提示符即返回）。发送失败返回 False。
+    sent_at 不为空表示该命令已在 analyze 流式输出时提前发送，只需等待响应；
+    这段间隔包含了 LLM 生成其余字段的时间，不计入该动词的延迟估计。
+    """
+    pacer = get_pacer(f"{client.ip}:{client.port}")
+    if sent_at is not None:
+        client.wait_for_response(pacer.wait_budget(payload))
+        return True
+    pacer.before_send()
+    log_colored("客户端", f"发送：{payload}", Colors.GREEN)
+    if not client.send(payload):
+        return False
+    sent_at = time.monotonic()
+    responded = client.wait_for_response(pacer.wait_budget(payload))
+    pacer.record(payload, time.monotonic() - sent_at, responded)
+    return True
+
+
 def act(state: AgentState) -> dict:
     """
     行动节点：发送 Payload 到服务器，更新交互历史。
+
+    analyze 给出多个命令（commands）时按流水线连续发送：除最后一个命令外，
+    每个响应由 act 读取并检查 expect，不符合预期立即停止；已读取的响应
+    通过 pending_output 交给下一轮 observe，与后续输出合并为一条消息。
+    analyze 流式输出时已提前发送的第一个命令（early_payload）不再重复发送。
     """
     client = state["client"]
     payload = state.get("payload", "")
     history = list(state.get("history", []))  # 拷贝
     server_output_clean = state.get("server_output_clean", "")
 
-    if payload:
-        log_colored("客户端", f"发送：{payload}", Colors.GREEN)
-        if client.send(payload):
-            history.append(f"In: {payload} | Out: {server_output_clean[:50]}...")
-        else:
+    commands = state.get("commands") or ([{"payload": payload, "expect": ""}] if payload else [])
+    if not commands:
+        log_colored("分析", "决定不发送任何内容。", Colors.CYAN)
+
+    pending_output = []
+    last_output = server_output_clean
+
+    # analyze 流式输出时已提前发送的命令不再重复发送
+    early_payload = state.get("early_payload", "")
+    if early_payload and (not commands or commands[0]["payload"] != early_payload):
+        # 最终决策与提前发送的命令不一致（例如校验失败后重试），提前发送的命令已无法撤回
+        log_colored("客户端", f"提前发送的命令 [{early_payload}] 与最终决策不一致", Colors.YELLOW)
+        history.append(f"In: {early_payload} | Out: {last_output[:50]}...")
+        early_payload = ""
+
+    for i, command in enumerate(commands):
+        cmd = command["payload"]
+        sent_at = state.get("early_sent_at") if i == 0 and early_payload else None
+        if not _send_paced(client, cmd, sent_at):
             # 发送失败 → 触发重连
             return {
                 "history": history,
+                "commands": [],
+                "early_payload": "",
                 "should_reconnect": True,
             }
-    else:
-        log_colored("分析", "决定不发送任何内容。", Colors.CYAN)
+        history.append(f"In: {cmd} | Out: {last_output[:50]}...")
+
+        if i == len(commands) - 1:
+            break  # 最后一个命令的响应留给 observe 读取
 
-    # 节奏控制
-    time.sleep(1)
+        response = client.receive_message(timeout=0)
+        if response is None:
+            return {
+                "history": history,
+                "commands": [],
+                "early_payload": "",
+                "should_reconnect": True,
+            }
+        pending_output.append(response)
+        last_output = client.clean_ansi(response)
+        if not matches_expectation(command["expect"], last_output):
+            log_colored("客户端", f"命令 [{cmd}] 的响应不符合预期（{command['expect']}），停止后续命令", Colors.YELLOW)
+            break
 
     return {
         "history": history,
+        "commands": [],
+        "early_payload": "",
+        "pending_output": "\n".join(o for o in pending_output if o),
         "should_reconnect": False,
     }
 
 
+def run_skill(state: AgentState) -> dict:
+    """
+    技能执行节点：analyze 选择了可自动执行的技能时代替 act。
+
+    不调用 LLM，直接通过连接逐步执行技能宏并检查每一步的响应；
+    全部通过时整段响应交给下一轮 observe；某一步失败时立即停止，
+    失败原因通过 skill_failure 告知下一轮 analyze，由 LLM 接手处理。
+    """
+    client = state["client"]
+    history = list(state.get("history", []))
+    skill_name = state.get("active_skill", "")
+    task_id = state.get("current_task", {}).get("id", "?")
+
+    skill = find_skill(state.get("skills", []), skill_name)
+    macro = get_macro(skill) if skill is not None else None
+    if macro is None:
+        return {"active_skill": "", "early_payload": "", "skill_failure": f"技能 [{skill_name}] 无法自动执行"}
+
+    # analyze 流式输出时已提前发送的命令：记入历史，并先读走它的响应，
+    # 不让它被当成技能第一步的响应来检查
+    early_payload = state.get("early_payload", "")
+    early_output = ""
+    if early_payload:
+        history.append(f"In: {early_payload} | Out: {state.get('server_output_clean', '')[:50]}...")
+        _send_paced(client, early_payload, state.get("early_sent_at"))
+        early_output = client.receive_message(timeout=0)
+        if early_output is None:
+            return {"history": history, "active_skill": "", "early_payload": "", "should_reconnect": True}
+
+    log_colored("技能", f"执行技能 [{macro.name}]（{len(macro.steps)} 步）", Colors.GREEN)
+    outcome = macro.run(client)
+    history.extend(outcome["history"])
+
+    result = {
+        "history": history,
+        "active_skill": "",
+        "early_payload": "",
+        "pending_output": "\n".join(o for o in (early_output, outcome["transcript"]) if o),
+        "should_reconnect": outcome["disconnected"],
+    }
+    if outcome["ok"]:
+        log_colored("技能", f"技能 [{macro.name}] 执行完成", Colors.GREEN)
+        log_task(task_id, "SKILL_DONE", macro.name)
+        result["skill_failure"] = ""
+    else:
+        failure = f"技能 [{macro.name}] 在第 {outcome['failed_step']}/{len(macro.steps)} 步失败（{outcome['reason']}）"
+        log_colored("技能", failure, Colors.YELLOW)
+        log_task(task_id, "SKILL_FAILED", failure)
+        result["skill_failure"] = failure
+    return result
+
+
 # ============================================================
 #  并行知识管理节点
 # ============================================================
@@ -675,6 +1038,7 @@ def start_knowledge_update_bg(state: AgentState) -> dict:
         "tasks": list(state.get("tasks", [])),
         "kb_consolidation_counter": state.get("kb_consolidation_counter", 0),
         "server_output_clean": state.get("server_output_clean", ""),
+        "server_data": dict(state.get("server_data", {})),
     }
 
     future = _kb_executor.submit(_run_knowledge_update_in_bg, state_snapshot)
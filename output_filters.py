@@ -0,0 +1,206 @@
+"""
+输出过滤模块
+按服务器配置的输出过滤器注册表。每个过滤器只编译一次，按顺序逐行应用，
+并统计耗时和删除的行数，便于判断哪些过滤器耗 CPU、哪些真正缩小了 prompt。
+
+另提供自发广播去重器：在滑动时间窗口内折叠重复的天气、频道、饥饿提示等广播。
+"""
+import hashlib
+import re
+import time
+from collections import OrderedDict
+
+import config
+from pattern_store import normalize
+
+
+# 内置过滤器：config 中可以直接按名称引用
+BUILTIN_FILTERS = {
+    # 编译器警告，例如：编译时段错误：/cmds/usr/inventory.c line 32: Warning: Unu...
+    "compiler_warning": {
+        "pattern": r"编译时段错误.*line \d+: Warning: Unu",
+        "contains": "编译时段错误",
+    },
+    # 频道闲聊，例如：【闲聊】张三(Zhangsan)：有人组队吗？
+    "channel_chat": {
+        "pattern": r"^\s*【(?:闲聊|谣言|江湖|交易|求助)】",
+        "contains": "【",
+    },
+}
+
+
+class OutputFilter:
+    """按行匹配的输出过滤器，匹配到的行会被整行删除"""
+
+    def __init__(self, name: str, pattern: str, contains: str = None):
+        self.name = name
+        self.regex = re.compile(pattern)
+        self.contains = contains  # 可选的预检子串：整段文本中不出现则跳过正则
+
+        self.calls = 0
+        self.seconds = 0.0
+        self.lines_removed = 0
+
+    def apply(self, lines: list[str], text: str) -> list[str]:
+        """过滤行列表；text 为过滤前的整段文本，仅用于预检"""
+        start = time.perf_counter()
+        if self.contains is None or self.contains in text:
+            kept = [line for line in lines if not self.regex.search(line)]
+            self.lines_removed += len(lines) - len(kept)
+            lines = kept
+        self.seconds += time.perf_counter() - start
+        self.calls += 1
+        return lines
+
+
+class FilterPipeline:
+    """按顺序应用的一组过滤器"""
+
+    def __init__(self, filters: list[OutputFilter]):
+        self.filters = filters
+        self.messages = 0
+
+    @classmethod
+    def from_specs(cls, specs: list) -> "FilterPipeline":
+        """
+        由配置构建过滤器链。
+        每项为 BUILTIN_FILTERS 中的名称，或 {"name", "pattern", "contains"} 字典。
+        """
+        filters = []
+        for spec in specs:
+            if isinstance(spec, str):
+                if spec not in BUILTIN_FILTERS:
+                    raise ValueError(f"未知的内置过滤器: {spec}")
+                spec = dict(BUILTIN_FILTERS[spec], name=spec)
+            filters.append(OutputFilter(spec["name"], spec["pattern"], spec.get("contains")))
+        return cls(filters)
+
+    def apply(self, text: str) -> str:
+        """依次应用所有过滤器，返回过滤后的文本"""
+        self.messages += 1
+        if not text or not self.filters:
+            return text
+        lines = text.split("\n")
+        for f in self.filters:
+            lines = f.apply(lines, text)
+            if not lines:
+                break
+        return "\n".join(lines)
+
+    def stats(self) -> list[dict]:
+        """每个过滤器的调用次数、累计耗时和删除行数"""
+        return [
+            {
+                "name": f.name,
+                "calls": f.calls,
+                "ms": round(f.seconds * 1000, 3),
+                "lines_removed": f.lines_removed,
+            }
+            for f in self.filters
+        ]
+
+    def format_stats(self) -> str:
+        return "; ".join(
+            f"{s['name']}: {s['calls']}次/{s['ms']}ms/删除{s['lines_removed']}行"
+            for s in self.stats()
+        )
+
+
+class BroadcastDeduplicator:
+    """
+    自发广播去重器（observe 阶段）。
+
+    对每行计算内容指纹（忽略数字和空白差异），在滑动时间窗口内记录自发输出
+    （不是对命令或连接的响应）中出现过的行；这样的行在窗口内再次出现在自发输出中时整行省略，
+    并在末尾追加 "(×N 条重复广播已省略)" 标记。
+    命令响应永远不删行（如连续两次 look、重连后的登录提示），也不计入广播记录。
+    同一条消息内连续重复的行折叠为一行并附 "(×N)"。
+    """
+
+    def __init__(self, window: float = None):
+        self.window = window if window is not None else config.DEDUP_WINDOW_SECONDS
+        # 指纹 → 最近一次在自发输出中出现的时间
+        self._seen: OrderedDict[bytes, float] = OrderedDict()
+        self.total_suppressed = 0
+
+    @staticmethod
+    def fingerprint(line: str) -> bytes:
+        return hashlib.blake2b(normalize(line).encode("utf-8"), digest_size=8).digest()
+
+    def _expire(self, now: float):
+        while self._seen:
+            fp, last = next(iter(self._seen.items()))
+            if now - last <= self.window:
+                break
+            self._seen.popitem(last=False)
+
+    def apply(self, text: str, spontaneous: bool, now: float = None) -> tuple[str, int, bool]:
+        """
+        去重一条消息。
+
+        Args:
+            text: 清洗后的消息文本
+            spontaneous: 消息是否为服务器自发输出（不是对命令或连接的响应）
+        Returns:
+            (去重后的文本, 被省略的行数, 是否整条消息都是重复广播)
+        """
+        if not text:
+            return text, 0, False
+        now = time.monotonic() if now is None else now
+        self._expire(now)
+
+        # 先折叠消息内连续重复的行
+        collapsed: list[tuple[str, int]] = []
+        for line in text.split("\n"):
+            if collapsed and line.strip() and collapsed[-1][0] == line:
+                collapsed[-1] = (line, collapsed[-1][1] + 1)
+            else:
+                collapsed.append((line, 1))
+
+        out = []
+        suppressed = 0
+        kept = 0
+        for line, count in collapsed:
+            if not line.strip():
+                out.append(line)
+                continue
+            if spontaneous:
+                fp = self.fingerprint(line)
+                seen = fp in self._seen
+                self._seen[fp] = now
+                self._seen.move_to_end(fp)
+                if seen:
+                    suppressed += count
+                    continue
+            kept += 1
+            out.append(f"{line} (×{count})" if count > 1 else line)
+
+        self.total_suppressed += suppressed
+        result = "\n".join(out).strip("\n")
+        if suppressed:
+            marker = f"(×{suppressed} 条重复广播已省略)"
+            result = f"{result}\n{marker}" if result else marker
+        return result, suppressed, suppressed > 0 and kept == 0
+
+
+_pipelines: dict[str, FilterPipeline] = {}
+_deduplicators: dict[str, BroadcastDeduplicator] = {}
+
+
+def get_pipeline(server_key: str) -> FilterPipeline:
+    """获取（并缓存）某个服务器的过滤器链：全局过滤器 + 该服务器的追加过滤器"""
+    pipeline = _pipelines.get(server_key)
+    if pipeline is None:
+        specs = list(config.OUTPUT_FILTERS) + list(config.SERVER_OUTPUT_FILTERS.get(server_key, []))
+        pipeline = FilterPipeline.from_specs(specs)
+        _pipelines[server_key] = pipeline
+    return pipeline
+
+
+def get_deduplicator(server_key: str) -> BroadcastDeduplicator:
+    """获取（并缓存）某个服务器的广播去重器"""
+    dedup = _deduplicators.get(server_key)
+    if dedup is None:
+        dedup = BroadcastDeduplicator()
+        _deduplicators[server_key] = dedup
+    return dedup
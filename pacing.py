@@ -0,0 +1,72 @@
+"""
+节奏控制模块
+act 节点的自适应节奏控制：按命令动词学习服务器响应延迟（EWMA），
+发送后只等待该动词需要的时间；同时遵守服务器侧的发送速率限制。
+"""
+import threading
+import time
+
+import config
+
+
+class PacingController:
+    """按服务器维护的自适应节奏控制器"""
+
+    def __init__(self):
+        self._ewma: dict[str, float] = {}  # 动词 → 首字节响应延迟的 EWMA（秒）
+        self._last_send = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def verb(payload: str) -> str:
+        """命令动词：第一个单词（小写）；空命令（回车翻页）记为 <enter>"""
+        parts = payload.strip().split(maxsplit=1)
+        return parts[0].lower() if parts else "<enter>"
+
+    def wait_budget(self, payload: str) -> float:
+        """发送后最多等待服务器开始响应的时间"""
+        latency = self._ewma.get(self.verb(payload))
+        if latency is None:
+            return config.ACT_RESPONSE_TIMEOUT
+        budget = latency * config.PACING_MARGIN
+        return min(max(budget, config.PACING_MIN_WAIT), config.PACING_MAX_WAIT)
+
+    def before_send(self):
+        """遵守服务器速率限制：距上次发送不足最小间隔时补足等待"""
+        min_interval = 1.0 / config.SERVER_MAX_COMMANDS_PER_SECOND
+        with self._lock:
+            now = time.monotonic()
+            delay = self._last_send + min_interval - now
+            if delay > 0:
+                time.sleep(delay)
+                now += delay
+            self._last_send = now
+
+    def record(self, payload: str, latency: float, responded: bool):
+        """
+        记录一次命令的响应延迟。
+        超时未响应时按等待预算的两倍计入，让该动词的预算逐步放宽。
+        """
+        verb = self.verb(payload)
+        if not responded:
+            latency = max(latency, self.wait_budget(payload)) * 2
+        alpha = config.PACING_EWMA_ALPHA
+        with self._lock:
+            previous = self._ewma.get(verb)
+            self._ewma[verb] = latency if previous is None else alpha * latency + (1 - alpha) * previous
+
+    def stats(self) -> dict[str, float]:
+        """各动词当前的延迟估计（毫秒）"""
+        return {verb: round(value * 1000, 1) for verb, value in self._ewma.items()}
+
+
+_pacers: dict[str, PacingController] = {}
+
+
+def get_pacer(server_key: str) -> PacingController:
+    """获取（并缓存）某个服务器的节奏控制器"""
+    pacer = _pacers.get(server_key)
+    if pacer is None:
+        pacer = PacingController()
+        _pacers[server_key] = pacer
+    return pacer
@@ -0,0 +1,56 @@
+"""
+学习到的模式的公共工具
+prompt_detector（提示符模式）、reflex（反射规则）、output_filters 和 decision_cache 共用：
+
+- tail_pattern: 尾行 → 数字泛化（替换为 \\d+）的整行正则
+- normalize: 忽略数字和空白差异的规范化文本（广播去重指纹、决策缓存键）
+- PatternStore: 按服务器持久化到 JSON 文件的学习结果
+"""
+import json
+import os
+import re
+
+
+_DIGITS_RE = re.compile(r"\d+")
+_SPACES_RE = re.compile(r"\s+")
+
+
+def tail_pattern(tail: str) -> str:
+    """尾行 → 匹配整行、数字泛化的正则"""
+    return r"^\s*" + _DIGITS_RE.sub(r"\\d+", re.escape(tail.strip())) + r"\s*$"
+
+
+def normalize(text: str) -> str:
+    """数字替换为 #、连续空白折叠为一个空格"""
+    return _SPACES_RE.sub(" ", _DIGITS_RE.sub("#", text)).strip()
+
+
+class PatternStore:
+    """某个服务器学习到的条目，保存在 directory/<服务器>.json 的 "learned" 列表中"""
+
+    def __init__(self, directory: str, server_key: str, label: str):
+        self.directory = directory
+        self.server_key = server_key
+        self.label = label  # 写入失败时的提示，如 "提示符模式"
+
+    @property
+    def path(self) -> str:
+        safe_key = re.sub(r"[^\w.-]", "_", self.server_key)
+        return os.path.join(self.directory, f"{safe_key}.json")
+
+    def load(self) -> list:
+        if not os.path.exists(self.path):
+            return []
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f).get("learned", [])
+        except (json.JSONDecodeError, OSError):
+            return []
+
+    def save(self, learned: list):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump({"server": self.server_key, "learned": learned}, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            print(f"写入{self.label}失败: {e}")
@@ -12,7 +12,11 @@ from state import AgentState
 
 import datetime
 
+from experience_index import get_experience_index
+from kb_index import search_kb
+from llm_resilience import LLMRetryBudgetExceeded
 from nodes import log_colored, get_aggregated_kb
+from prompt_builder import PromptBuilder, token_budget, ROLE, SKILLS, PHASE, KNOWLEDGE, LATEST
 from reflector import reflect_on_task
 
 
@@ -99,7 +103,7 @@ def planner(state: AgentState) -> dict:
             full_kb = get_aggregated_kb(phase, knowledge_base)
             tasks = _generate_phase_tasks(
                 llm, phase, completed_phases, full_kb, environment_type
-            )
+            ) or []
             _log("规划者", f"第{phase}阶段任务已生成（{len(tasks)}个任务）", Colors.BLUE)
             _log_planner_event("PHASE_START", f"开始阶段 {phase}: {state.get('phase_name', '未命名')} (任务数: {len(tasks)})")
             for t in tasks:
@@ -202,6 +206,9 @@ def planner(state: AgentState) -> dict:
         
         new_phase_name = _determine_phase_name(llm, new_phase, completed_phases, full_kb_for_planning, environment_type)
         new_tasks = _generate_phase_tasks(llm, new_phase, completed_phases, full_kb_for_planning, environment_type)
+        if new_tasks is None:
+            # 新阶段任务制定失败：暂不推进阶段，任务陷入僵局后回到规划者时再尝试
+            return {"tasks": tasks, "current_task": {}, "task_completed": False}
 
         _log("规划者", f"进入阶段 {new_phase}: {new_phase_name}（{len(new_tasks)}个任务）", Colors.BLUE)
         _log_planner_event("PHASE_START", f"开始阶段 {new_phase}: {new_phase_name} (任务数: {len(new_tasks)})")
@@ -278,7 +285,7 @@ def planner(state: AgentState) -> dict:
 # ============================================================
 
 def _generate_phase_tasks(llm, phase, completed_phases, knowledge_base, environment_type):
-    """由 LLM 推算新阶段的任务列表"""
+    """由 LLM 推算新阶段的任务列表；LLM 调用失败（重试预算耗尽）时返回 None"""
     phases_str = ""
     for cp in completed_phases:
         phases_str += f"\n### 阶段 {cp['phase']}: {cp['name']}\n"
@@ -325,11 +332,15 @@ def _generate_phase_tasks(llm, phase, completed_phases, knowledge_base, environm
     def validator(res):
         return isinstance(res, dict) and "tasks" in res and isinstance(res["tasks"], list)
 
-    result = llm.call_with_retry(
-        system_prompt, f"请为第 {phase} 阶段制定任务。",
-        json_mode=True, validator=validator, model=config.REASONER_MODEL,
-        caller_id=f"Planner-GenerateTasks[Phase{phase}]"
-    )
+    try:
+        result = llm.call_with_retry(
+            system_prompt, f"请为第 {phase} 阶段制定任务。",
+            json_mode=True, validator=validator, model=config.REASONER_MODEL,
+            caller_id=f"Planner-GenerateTasks[Phase{phase}]"
+        )
+    except LLMRetryBudgetExceeded as e:
+        _log("规划者", f"制定第{phase}阶段任务失败，稍后重试：{e}", Colors.RED)
+        return None
 
     tasks = []
     for t in result.get("tasks", []):
@@ -354,11 +365,15 @@ def _determine_phase_name(llm, phase, completed_phases, knowledge_base, environm
 严格以 JSON 格式输出：
 {{"phase_name": "简短的阶段名称"}}
 """
-    result = llm.call_with_retry(
-        system_prompt, f"请为第 {phase} 阶段命名。",
-        json_mode=True, model=config.REASONER_MODEL,
-        caller_id=f"Planner-NamePhase[Phase{phase}]"
-    )
+    try:
+        result = llm.call_with_retry(
+            system_prompt, f"请为第 {phase} 阶段命名。",
+            json_mode=True, model=config.REASONER_MODEL,
+            caller_id=f"Planner-NamePhase[Phase{phase}]"
+        )
+    except LLMRetryBudgetExceeded as e:
+        _log("规划者", f"阶段命名失败，使用默认名称：{e}", Colors.RED)
+        return f"阶段{phase}"
     return result.get("phase_name", f"阶段{phase}")
 
 
@@ -369,34 +384,35 @@ def _create_execution_plan(llm, task, history, knowledge_base, phase, phase_name
     
     skill_str = ""
     if skills:
-        skill_str = "可用技能:\n"
-        for s in skills:
+        for s in get_experience_index().select_skills(skills, task_desc):
             skill_str += f"- {s.get('name')}: {s.get('description')} (触发条件: {s.get('trigger')})\n"
     else:
         skill_str = "暂无可用技能。"
-    
-    system_prompt = f"""
-你是一个 MUD 游戏智能体的规划模块。
-
-当前阶段: {phase} - {phase_name}
-任务 [{task_id}]: {task_desc}
-
-{skill_str}
-
-当前知识库概览:
-{_format_kb(knowledge_base)}
 
+    # 超出推理模型的 token 预算时先裁剪技能列表，再裁剪相关度最低的知识条目
+    prompt = PromptBuilder(budget=token_budget(config.REASONER_MODEL))
+    prompt.add(ROLE, "你是一个 MUD 游戏智能体的规划模块。")
+    prompt.add(PHASE, f"当前阶段: {phase} - {phase_name}\n任务 [{task_id}]: {task_desc}")
+    prompt.add(SKILLS, skill_str, title="可用技能:", priority=1, keep="head")
+    prompt.add(KNOWLEDGE, _format_kb(knowledge_base, limit=config.KB_TOP_K, query=task_desc),
+               title="当前知识库概览（按相关度排序）:", priority=2, keep="head")
+    prompt.add(LATEST, """\
 你需要为该任务制定一个详细的执行计划。
 如果任务描述模糊，请根据知识库和阶段目标进行推断。
 如果有一致的技能，请优先在计划中引用技能。
 
-请直接输出计划内容（步骤列表或一段指导性文字），不要包含 JSON 或其他格式。
-"""
-    result = llm.call_with_retry(
-        system_prompt, f"请为任务 {task['id']} 制定执行计划。",
-        json_mode=False, model=config.REASONER_MODEL,
-        caller_id=f"Planner-Plan[Task{task.get('id', '?')}]"
-    )
+请直接输出计划内容（步骤列表或一段指导性文字），不要包含 JSON 或其他格式。""")
+    system_prompt = prompt.build()
+    try:
+        result = llm.call_with_retry(
+            system_prompt, f"请为任务 {task['id']} 制定执行计划。",
+            json_mode=False, model=config.REASONER_MODEL,
+            caller_id=f"Planner-Plan[Task{task.get('id', '?')}]"
+        )
+    except LLMRetryBudgetExceeded as e:
+        # 没有计划也能执行：分析节点按任务描述自行推进
+        _log("规划者", f"制定执行计划失败，按任务描述执行：{e}", Colors.RED)
+        return "无特定计划，请根据任务描述自行推进。"
     return result
 
 
@@ -409,12 +425,21 @@ def _extract_key_findings(tasks):
     return "; ".join(findings) if findings else "无"
 
 
-def _format_kb(knowledge_base, limit=30):
-    """格式化知识库为字符串"""
+def _format_kb(knowledge_base, limit=30, query=None):
+    """
+    格式化知识库为字符串。
+    给出 query 时按 BM25 相关度挑选 limit 条（降序），否则取最新的 limit 条；limit 为 None 时输出全部条目。
+    """
     if not knowledge_base:
         return "暂无。"
+    if limit is None:
+        entries = knowledge_base
+    elif query:
+        entries = search_kb("phase", knowledge_base, query, k=limit)
+    else:
+        entries = knowledge_base[-limit:]
     kb_str = ""
-    for entry in knowledge_base[-limit:]:
+    for entry in entries:
         if isinstance(entry, dict):
             kb_str += f"- [{entry.get('category', '?')}] {entry.get('content', '')}\n"
         else:
@@ -429,8 +454,9 @@ def _handle_stuck_task(llm, task, stuck_reason, knowledge_base, phase):
     1. skip: 跳过（非关键任务）
     2. partial: 部分完成（已取得部分成果）
     3. retry: 修改描述后重试（改变方法）
+    LLM 调用失败（重试预算耗尽）时保持 pending，稍后重新尝试。
     """
-    kb_str = _format_kb(knowledge_base, limit=20)
+    kb_str = _format_kb(knowledge_base, limit=20, query=f"{task.get('description', '')}\n{stuck_reason}")
     
     system_prompt = f"""
 你是一个项目经理。当前阶段（{phase}）的一个任务陷入了僵局，分析节点经过多次尝试仍无法完成。
@@ -460,12 +486,17 @@ ID: {task.get('id')}
     "result_summary": "如果选择 skip 或 completed，请提供任务结果摘要（基于僵局原因）"
 }}
 """
-    result = llm.call_with_retry(
-        system_prompt, "请决策如何处理僵局任务。",
-        json_mode=True, model=config.REASONER_MODEL,
-        caller_id=f"Planner-Stuck[Task{task.get('id', '?')}]"
-    )
-    
+    try:
+        result = llm.call_with_retry(
+            system_prompt, "请决策如何处理僵局任务。",
+            json_mode=True, model=config.REASONER_MODEL,
+            caller_id=f"Planner-Stuck[Task{task.get('id', '?')}]"
+        )
+    except LLMRetryBudgetExceeded as e:
+        # 无法决策时保留任务，稍后重新尝试
+        _log("规划者", f"僵局决策失败，任务保持待执行：{e}", Colors.RED)
+        return {"status": "pending", "result": None}
+
     action = result.get("action", "skip")
     new_desc = result.get("new_description", task.get("description"))
     res_summary = result.get("result_summary", stuck_reason)
@@ -0,0 +1,158 @@
+"""
+Prompt 组装模块
+按稳定程度从高到低排列 prompt 片段，让相邻两次调用共享尽可能长的前缀，
+命中服务商的上下文缓存（DeepSeek 对缓存命中的前缀按低价计费，且响应更快）。
+
+稳定性等级（从最稳定到最易变）：
+  ROLE       角色与规则、输出格式（几乎不变）
+  SKILLS     经验与技能（反思后才变）
+  PHASE      阶段、当前任务与计划（任务切换时才变）
+  KNOWLEDGE  知识库（逐步增长）
+  HISTORY    交互历史（每轮追加）
+  LATEST     最新输出、结构化数据、尝试次数等（每轮都变）
+
+裁剪分两层，都是按行删除（保留开头或结尾）并注明省略了多少行：
+- 单个片段的上限（add 的 max_tokens，如 config.PROMPT_KB_TOKENS），控制每次调用的常规开销
+- 整个 prompt 的模型预算（config.PROMPT_TOKEN_BUDGETS），仅作兜底：超出时从优先级最低的片段开始裁剪
+token 数用本地估算，装有 tiktoken 时使用其编码器。
+"""
+import re
+
+import config
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:  # 未安装 tiktoken 或编码文件不可用时使用估算
+    _ENCODING = None
+
+ROLE = 0
+SKILLS = 1
+PHASE = 2
+KNOWLEDGE = 3
+HISTORY = 4
+LATEST = 5
+
+_CJK_RE = re.compile(r"[　-〿㐀-䶿一-鿿＀-￯]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    估算文本的 token 数。
+    未安装 tiktoken 时按 DeepSeek 给出的换算比例：1 个中文字符约 0.6 token，1 个英文字符约 0.3 token。
+    """
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    cjk = len(_CJK_RE.findall(text))
+    return round(cjk * 0.6 + (len(text) - cjk) * 0.3)
+
+
+def token_budget(model: str = None) -> int:
+    """某个模型的 system prompt token 预算"""
+    model = model or config.MODEL
+    return config.PROMPT_TOKEN_BUDGETS.get(model, config.PROMPT_DEFAULT_TOKEN_BUDGET)
+
+
+class _Segment:
+    def __init__(self, level: int, order: int, text: str, title: str, priority, keep: str,
+                 max_tokens: int = None):
+        self.level = level
+        self.max_tokens = max_tokens
+        self.order = order
+        self.title = title
+        self.lines = text.strip("\n").split("\n")
+        self.priority = priority
+        self.keep = keep
+        self.omitted = 0
+        self.clipped = False
+
+    def render(self) -> str:
+        lines = list(self.lines)
+        if self.clipped and lines:
+            lines[0 if self.keep == "tail" else -1] = (
+                f"……{lines[0]}" if self.keep == "tail" else f"{lines[-1]}……"
+            )
+        if self.omitted:
+            marker = f"……（已省略 {self.omitted} 行）"
+            if self.keep == "tail":
+                lines.insert(0, marker)
+            else:
+                lines.append(marker)
+        body = "\n".join(lines)
+        return f"{self.title}\n{body}" if self.title else body
+
+    def shrink(self, excess: int) -> int:
+        """按行删除，直到减少约 excess 个 token；返回实际减少的 token 数"""
+        saved = 0
+        while len(self.lines) > 1 and saved < excess:
+            saved += estimate_tokens(self.lines.pop(0 if self.keep == "tail" else -1) + "\n")
+            self.omitted += 1
+        if saved < excess and self.lines:
+            # 只剩一行仍超出（如整段服务器输出只有一行）：按字符截断
+            line = self.lines[0]
+            tokens = estimate_tokens(line)
+            keep_chars = int(len(line) * max(0.0, 1 - (excess - saved) / max(tokens, 1)))
+            if keep_chars <= 0:
+                self.lines = []
+                self.omitted += 1
+                saved += tokens
+            else:
+                clipped = line[-keep_chars:] if self.keep == "tail" else line[:keep_chars]
+                self.lines = [clipped]
+                self.clipped = True
+                saved += tokens - estimate_tokens(clipped)
+        return saved
+
+
+class PromptBuilder:
+    """
+    按稳定性排序、按 token 预算裁剪的 prompt 组装器；同一等级内保持添加顺序。
+
+    add 的 priority 为 None 表示必需片段，永不裁剪；否则数值越小越先被裁剪。
+    keep 决定裁剪时保留哪一端："tail" 保留结尾（历史、知识库等按时间追加的内容），
+    "head" 保留开头。max_tokens 为该片段自身的上限，不论总预算是否超出都会生效。
+    """
+
+    def __init__(self, budget: int = None):
+        self.budget = budget
+        self._segments: list[_Segment] = []
+
+    def add(self, level: int, text: str, title: str = "", priority: int = None,
+            keep: str = "tail", max_tokens: int = None) -> "PromptBuilder":
+        """添加一个片段；空片段忽略"""
+        if text and text.strip():
+            self._segments.append(
+                _Segment(level, len(self._segments), text, title, priority, keep, max_tokens)
+            )
+        return self
+
+    def _cap(self):
+        for segment in self._segments:
+            if not segment.max_tokens:
+                continue
+            # 逐行估算与整段估算有偏差（省略标记也占 token），重新测量直到不超过上限
+            excess = estimate_tokens(segment.render()) - segment.max_tokens
+            while excess > 0 and segment.shrink(excess) > 0:
+                excess = estimate_tokens(segment.render()) - segment.max_tokens
+
+    def _fit(self):
+        total = sum(estimate_tokens(s.render()) for s in self._segments)
+        excess = total - self.budget
+        if excess <= 0:
+            return
+        for segment in sorted(
+            (s for s in self._segments if s.priority is not None),
+            key=lambda s: (s.priority, -s.order),
+        ):
+            excess -= segment.shrink(excess)
+            if excess <= 0:
+                break
+
+    def build(self) -> str:
+        self._cap()
+        if self.budget:
+            self._fit()
+        ordered = sorted(self._segments, key=lambda s: (s.level, s.order))
+        return "\n\n".join(s.render() for s in ordered) + "\n"
@@ -0,0 +1,65 @@
+"""
+提示符检测模块
+判断服务器当前是否在等待输入（显示了提示符），而不是仍在输出中。
+
+模式来源：
+- 全局默认模式（config.PROMPT_PATTERNS）
+- 按服务器配置的模式（config.SERVER_PROMPT_PATTERNS）
+- 运行中学习到的模式：流静默时仍未以换行结束的尾行多次出现后，
+  泛化为正则（数字替换为 \\d+）并持久化到 config.PROMPT_DIR
+"""
+import re
+
+import config
+from pattern_store import PatternStore, tail_pattern
+
+
+class PromptDetector:
+    """按服务器维护的提示符检测器"""
+
+    def __init__(self, server_key: str):
+        self.server_key = server_key
+        self._store = PatternStore(config.PROMPT_DIR, server_key, "提示符模式")
+        self.learned: list[str] = self._store.load()
+        self.candidates: dict[str, int] = {}  # 候选模式 → 出现次数
+        self._regex = None
+        self._compile()
+
+    def _compile(self):
+        patterns = (
+            list(config.PROMPT_PATTERNS)
+            + list(config.SERVER_PROMPT_PATTERNS.get(self.server_key, []))
+            + self.learned
+        )
+        self._regex = re.compile("|".join(f"(?:{p})" for p in patterns)) if patterns else None
+
+    def is_prompt(self, tail: str) -> bool:
+        """尾行（未以换行结束的部分）是否为提示符"""
+        return bool(tail) and self._regex is not None and self._regex.search(tail) is not None
+
+    def observe_unterminated(self, tail: str) -> bool:
+        """
+        记录一次“流静默时仍未以换行结束、且未匹配任何模式”的尾行。
+        同一模式出现 config.PROMPT_LEARN_THRESHOLD 次后学习为提示符。
+        返回是否学习到了新模式。
+        """
+        tail = tail.strip()
+        if not tail or len(tail) > config.PROMPT_LEARN_MAX_LENGTH or self.is_prompt(tail):
+            return False
+        pattern = tail_pattern(tail)
+        count = self.candidates.get(pattern, 0) + 1
+        if count < config.PROMPT_LEARN_THRESHOLD:
+            self.candidates[pattern] = count
+            return False
+        self.candidates.pop(pattern, None)
+        self.add_pattern(pattern)
+        return True
+
+    def add_pattern(self, pattern: str):
+        """添加（并持久化）一个提示符模式"""
+        re.compile(pattern)  # 无效模式直接抛出 re.error
+        if pattern in self.learned:
+            return
+        self.learned.append(pattern)
+        self._compile()
+        self._store.save(self.learned)
@@ -10,7 +10,9 @@ from typing import List, Dict, Any
 
 import config
 from config import Colors
+from experience_index import get_experience_index
 from nodes import log_colored
+from prompt_builder import PromptBuilder, token_budget, ROLE, HISTORY, LATEST
 
 def _log_reflector(message: str, color: str = None):
     """Reflector dedicated logging"""
@@ -87,7 +89,9 @@ def reflect_on_task(llm: Any, task: Dict, knowledge_base: List[Dict], phase: int
     existing_exp_str = json.dumps(current_experiences[-5:], indent=2, ensure_ascii=False) if current_experiences else "None"
     existing_skills_str = json.dumps([s["name"] for s in current_skills], indent=2, ensure_ascii=False) if current_skills else "None"
     
-    system_prompt = f"""
+    # The log keeps its most recent PROMPT_TASK_LOG_TOKENS; the model budget is only a backstop
+    prompt = PromptBuilder(budget=token_budget(config.REASONER_MODEL))
+    prompt.add(ROLE, f"""\
 You are an advanced AI Reflector. Your goal is to analyze the execution log of a task performed by an autonomous agent in a text-based environment (MUD) and distill valuable Experience and reusable Skills.
 
 Task ID: {task_id}
@@ -99,36 +103,39 @@ Existing Skills: {existing_skills_str}
 
 Your analysis should Focus on:
 1. **Experience (Generic Lessons)**: What went wrong? What went right? What general usage patterns regarding the environment or commands were discovered? (e.g., "The 'look' command shows exits", "NPCs named 'Guard' block the way").
-2. **Skills (Reusable Procedures)**: Identify specific, repeatable sequences of actions that achieved a sub-goal. A skill must have a clear Trigger (when to use) and Steps. (e.g., "Skill: Check Inventory", "Skill: Navigate to Town Square").
-
-Input - Task Execution Log:
-{task_log_content[-8000:]} 
-(Log truncated if too long)
-
+2. **Skills (Reusable Procedures)**: Identify specific, repeatable sequences of actions that achieved a sub-goal. A skill must have a clear Trigger (when to use) and Steps. (e.g., "Skill: Check Inventory", "Skill: Navigate to Town Square").""")
+    prompt.add(HISTORY, task_log_content, title="Input - Task Execution Log:", priority=1,
+               max_tokens=config.PROMPT_TASK_LOG_TOKENS)
+    prompt.add(LATEST, """\
 Output Requirements:
 Strictly valid JSON format:
-{{
+{
     "new_experiences": [
-        {{
+        {
             "summary": "One sentence summary",
             "lesson": "Detailed lesson learned",
             "tags": ["tag1", "tag2"]
-        }}
+        }
     ],
     "new_skills": [
-        {{
+        {
             "name": "Skill Name",
             "description": "What this skill does",
             "trigger": "When should this skill be used (context/conditions)",
             "steps": ["step 1", "step 2", "step 3"],
+            "script": [
+                {"send": "exact command", "expect": "keyword or regex expected in the response", "fail": "keyword or regex indicating failure"}
+            ],
             "expected_outcome": "What happens after execution",
             "tags": ["tag1"]
-        }}
+        }
     ]
-}}
+}
 
-If no valuable experience or new skill is found, return empty lists. Do NOT duplicate existing skills unless you are improving them significantly.
-    """
+For skills consisting of fixed commands, also provide "script": the exact commands to send in order, each with "expect" (a keyword/regex that must appear in the server response, or "" if unknown) and "fail" (a keyword/regex that indicates the step failed, or ""). Only skills with a "script" can be executed automatically. The script is replayed directly without an LLM, so never use placeholders such as <name>; omit "script" if the commands depend on the situation.
+
+If no valuable experience or new skill is found, return empty lists. Do NOT duplicate existing skills unless you are improving them significantly.""")
+    system_prompt = prompt.build()
 
     # 4. Call LLM
     try:
@@ -168,5 +175,7 @@ If no valuable experience or new skill is found, return empty lists. Do NOT dupl
         
     if new_experiences or new_skills:
         _save_experiences(existing_data)
+        # Incrementally index the new entries so analyze can retrieve them without a rebuild
+        get_experience_index().add(new_experiences, new_skills)
         
     return {"new_experiences": new_experiences, "new_skills": new_skills}
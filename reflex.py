@@ -0,0 +1,194 @@
+"""
+反射模块
+对确定性的服务器提示直接给出回应，不调用 LLM：
+分页 [More] → 回车，“您的英文名字：” → 配置的名字，"Press any key" → 回车……
+
+规则来源：
+- 全局规则（config.REFLEX_RULES）
+- 按服务器配置的规则（config.SERVER_REFLEX_RULES）
+- 运行中学习到的规则：同一尾行提示连续多次得到 analyze 相同的回应后，
+  固化为规则并持久化到 config.REFLEX_DIR。只从 PromptDetector 认定的提示符学习，
+  裸命令提示符（">"）和状态栏（数字多、HP/MP、config.REFLEX_LEARN_DENY_PATTERNS）不学习
+所有规则编译为一个带命名分组的组合正则，只对输出的最后一行匹配。
+
+防止规则把智能体困在循环里：
+- 同一规则对不变的输出连续命中 config.REFLEX_MAX_REPEATS 次时不再回应；学习到的规则同时被删除
+- 连续 config.REFLEX_MAX_STREAK 次命中（中间没有经过 analyze）后，下一条消息交给 analyze
+"""
+import re
+
+import config
+from pattern_store import PatternStore, tail_pattern
+
+
+_LETTERS_RE = re.compile(r"[^\W\d_]")
+_DENY_RE = re.compile("|".join(f"(?:{p})" for p in config.REFLEX_LEARN_DENY_PATTERNS)) \
+    if config.REFLEX_LEARN_DENY_PATTERNS else None
+
+
+def _is_status_line(tail: str) -> bool:
+    """尾行是裸命令提示符或状态栏：对它的回应取决于当时的状态，不能固化为规则"""
+    if len(_LETTERS_RE.findall(tail)) < config.REFLEX_LEARN_MIN_LETTERS:
+        return True
+    chars = [c for c in tail if not c.isspace()]
+    if sum(c.isdigit() for c in chars) > len(chars) * config.REFLEX_LEARN_MAX_DIGIT_RATIO:
+        return True
+    return _DENY_RE is not None and _DENY_RE.search(tail) is not None
+
+
+class ReflexMatcher:
+    """按服务器维护的反射规则匹配器"""
+
+    def __init__(self, server_key: str):
+        self.server_key = server_key
+        self._store = PatternStore(config.REFLEX_DIR, server_key, "反射规则")
+        self.learned: list[dict] = self._store.load()
+        self.candidate = None                  # 正在学习的尾行 {"pattern", "response", "count"}
+        self.ambiguous: set[str] = set()       # 曾得到不同回应的尾行模式，不再学习
+        self.streak = 0                        # 连续命中次数（analyze 运行后清零）
+        self._last_hit = None                  # 上一次命中的 (规则名, 输出)
+        self._repeats = 0                      # 同一规则对不变输出的连续命中次数
+        self.rules: list[dict] = []
+        self._regex = None
+        self._compile()
+
+        self.checks = 0
+        self.hits: dict[str, int] = {}  # 规则名 → 命中次数
+
+    def _compile(self):
+        rules = (
+            list(config.REFLEX_RULES)
+            + list(config.SERVER_REFLEX_RULES.get(self.server_key, []))
+            + self.learned
+        )
+        # 引用了未配置变量（如未设置名字）的规则不启用
+        self.rules = [r for r in rules if self._render(r["response"]) is not None]
+        self._regex = re.compile(
+            "|".join(f"(?P<r{i}>{r['pattern']})" for i, r in enumerate(self.rules))
+        ) if self.rules else None
+
+    @staticmethod
+    def _render(response: str):
+        """替换回应中的 {变量}（config.REFLEX_VARIABLES）；变量未配置时返回 None"""
+        try:
+            rendered = response.format(**config.REFLEX_VARIABLES)
+        except (KeyError, IndexError, ValueError):
+            return None
+        if "{" in response and not rendered.strip():
+            return None
+        return rendered
+
+    @staticmethod
+    def _tail(text: str) -> str:
+        """最后一个非空行"""
+        for line in reversed(text.split("\n")):
+            if line.strip():
+                return line.strip()
+        return ""
+
+    def match(self, text: str):
+        """
+        对输出的最后一行匹配规则。
+        命中时返回 (规则名, 回应)，否则返回 None。
+        """
+        self.checks += 1
+        tail = self._tail(text)
+        m = self._regex.search(tail) if tail and self._regex is not None else None
+        if m is None or self.streak >= config.REFLEX_MAX_STREAK:
+            # 未命中或连续命中过多：交给 analyze
+            self._reset_streak()
+            return None
+        rule = self.rules[int(m.lastgroup[1:])]
+        name = rule.get("name", rule["pattern"])
+        self._repeats = self._repeats + 1 if self._last_hit == (name, text) else 1
+        self._last_hit = (name, text)
+        if self._repeats >= config.REFLEX_MAX_REPEATS:
+            # 回应没有改变输出：规则无效，学习到的规则直接删除
+            if rule in self.learned:
+                self.remove_rule(rule)
+                print(f"反射规则 [{name}] 连续 {self._repeats} 次未改变输出，已删除")
+            self._reset_streak()
+            return None
+        self.streak += 1
+        self.hits[name] = self.hits.get(name, 0) + 1
+        return name, self._render(rule["response"])
+
+    def _reset_streak(self):
+        self.streak = 0
+        self._last_hit = None
+        self._repeats = 0
+
+    def observe_decision(self, text: str, payload: str, detector) -> bool:
+        """
+        记录一次 analyze 对输出的回应。
+        同一尾行提示（数字泛化）连续 config.REFLEX_LEARN_THRESHOLD 次得到相同回应时学习为规则，
+        中间出现其他尾行即重新计数；出现过不同回应的提示不再学习。
+        只学习 detector（PromptDetector）认定为提示符、且不是状态栏的尾行。
+        返回是否学习到了新规则。
+        """
+        tail = self._tail(text)
+        if (not tail or len(tail) > config.PROMPT_LEARN_MAX_LENGTH
+                or not detector.is_prompt(tail) or _is_status_line(tail)):
+            self.candidate = None
+            return False
+        pattern = tail_pattern(tail)
+        if pattern in self.ambiguous:
+            self.candidate = None
+            return False
+        candidate = self.candidate
+        if candidate is not None and candidate["pattern"] != pattern:
+            candidate = None
+        if candidate is not None and candidate["response"] != payload:
+            self.candidate = None
+            self.ambiguous.add(pattern)
+            return False
+        count = (candidate["count"] if candidate else 0) + 1
+        if count < config.REFLEX_LEARN_THRESHOLD:
+            self.candidate = {"pattern": pattern, "response": payload, "count": count}
+            return False
+        self.candidate = None
+        self.add_rule({"name": f"learned:{tail}", "pattern": pattern, "response": payload.replace("{", "{{").replace("}", "}}")})
+        return True
+
+    def add_rule(self, rule: dict):
+        """添加（并持久化）一条学习到的规则"""
+        re.compile(rule["pattern"])  # 无效模式直接抛出 re.error
+        if any(r["pattern"] == rule["pattern"] for r in self.learned):
+            return
+        self.learned.append(rule)
+        self._compile()
+        self._store.save(self.learned)
+
+    def remove_rule(self, rule: dict):
+        """删除（并持久化）一条学习到的规则，该尾行以后不再学习"""
+        self.learned = [r for r in self.learned if r["pattern"] != rule["pattern"]]
+        self.ambiguous.add(rule["pattern"])
+        self._compile()
+        self._store.save(self.learned)
+
+    def stats(self) -> dict:
+        """检查次数、命中次数（即省下的 LLM 调用次数）、命中率和各规则命中次数"""
+        total_hits = sum(self.hits.values())
+        return {
+            "checks": self.checks,
+            "hits": total_hits,
+            "hit_rate": round(total_hits / self.checks, 3) if self.checks else 0.0,
+            "rules": dict(self.hits),
+        }
+
+    def format_stats(self) -> str:
+        s = self.stats()
+        rules = ", ".join(f"{name}: {count}" for name, count in s["rules"].items()) or "无"
+        return f"检查 {s['checks']} 次，命中 {s['hits']} 次（省下 {s['hits']} 次 LLM 调用，命中率 {s['hit_rate']:.1%}）；{rules}"
+
+
+_matchers: dict[str, ReflexMatcher] = {}
+
+
+def get_reflex(server_key: str) -> ReflexMatcher:
+    """获取（并缓存）某个服务器的反射规则匹配器"""
+    matcher = _matchers.get(server_key)
+    if matcher is None:
+        matcher = ReflexMatcher(server_key)
+        _matchers[server_key] = matcher
+    return matcher
@@ -19,6 +19,8 @@ class AgentState(TypedDict, total=False):
     # --- 当前轮数据 ---
     server_output: str       # 服务器原始输出（含 ANSI）
     server_output_clean: str # 清洗后的纯文本输出
+    server_data: dict        # GMCP/MSDP 结构化数据最新快照（包名 → 数据）
+    idle_skips: int          # 连续因“全是重复广播”而跳过分析的次数
 
     # --- 记忆 ---
     history: list[str]       # 短期交互历史
@@ -35,6 +37,13 @@ class AgentState(TypedDict, total=False):
     # --- LLM 决策结果 ---
     analysis: str            # LLM 分析文本
     payload: str             # 要发送的 Payload
+    commands: list[dict]     # 流水线命令 [{payload, expect}]（多于一个命令时由 act 连续发送）
+    pending_output: str      # act 流水线中已读取、尚未交给 observe 的服务器输出
+    active_skill: str        # analyze 选择直接执行的技能名称（由 run_skill 节点执行）
+    skill_failure: str       # 上一次技能执行失败的原因（交给 analyze 处理）
+    early_payload: str       # analyze 流式输出时已提前发送的命令（act 不再重复发送）
+    early_sent_at: float     # 提前发送的时间（time.monotonic()）
+    reflex_rule: str         # 本轮命中的反射规则名称（命中时跳过 analyze）
 
     # --- 控制流 ---
     should_reconnect: bool   # 需要重连（连接断开）
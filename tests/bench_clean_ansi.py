@@ -0,0 +1,82 @@
+"""
+clean_ansi 微基准
+对比旧实现（未编译正则 + 逐字符生成器）与当前 SocketClient.clean_ansi 的吞吐量。
+
+用法:
+    python tests/bench_clean_ansi.py                 # 使用内置的 MUD 输出样本
+    python tests/bench_clean_ansi.py <录制的输出文件>  # 例如 logs/system/interaction.log
+"""
+import os
+import re
+import sys
+import time
+
+# Add parent directory to sys.path to import connection_manager
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from connection_manager import SocketClient
+
+# 内置样本：带颜色码的房间描述、NPC、分页提示和登录提示
+SAMPLE_MUD_OUTPUT = (
+    "\x1b[1;36m【扬州广场】\x1b[0m\r\n"
+    "    这里是扬州城的中心广场，青石板铺成的地面被往来的行人磨得发亮。\r\n"
+    "广场中央有一棵\x1b[32m大榕树\x1b[0m，树下围着一群看热闹的人。\r\n"
+    "    这里明显的出口是 \x1b[1;33meast\x1b[0m、\x1b[1;33mwest\x1b[0m、"
+    "\x1b[1;33msouth\x1b[0m 和 \x1b[1;33mnorth\x1b[0m。\r\n"
+    "  \x1b[1;37m店小二(Xiao er)\x1b[0m\r\n"
+    "  \x1b[31m流氓(Liu mang)\x1b[0m\r\n"
+    "\x1b[33m【闲聊】张三(Zhangsan)：有人组队去打山贼吗？\x1b[0m\r\n"
+    "== 未完继续 37% == (ENTER 继续下一页，q 离开，b 前一页)\r\n"
+    "\x07\x1b[2J\x1b[H您的英文名字："
+)
+SAMPLE_ASCII_OUTPUT = (
+    "\x1b[1;36m[Town Square]\x1b[0m\r\n"
+    "  You are standing in the town square. \x1b[32mA large banyan tree\x1b[0m grows here.\r\n"
+    "  Obvious exits: \x1b[1;33meast\x1b[0m, \x1b[1;33mwest\x1b[0m, \x1b[1;33mnorth\x1b[0m.\r\n"
+    "  \x1b[1;37mA waiter (Xiao er)\x1b[0m\r\n"
+    "> "
+)
+
+
+def legacy_clean_ansi(text: str) -> str:
+    """优化前的实现（用于对比）"""
+    text_clean = re.sub(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])', '', text)
+    text_clean = "".join(
+        ch for ch in text_clean
+        if ch == '\n' or (ord(ch) >= 32 and ord(ch) != 127)
+    )
+    return text_clean
+
+
+def bench(func, text: str, min_seconds: float = 0.5) -> float:
+    """返回吞吐量（KB/s）"""
+    size_kb = len(text.encode("utf-8")) / 1024
+    runs = 0
+    start = time.perf_counter()
+    while True:
+        func(text)
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return size_kb * runs / elapsed
+
+
+def run_case(name: str, text: str):
+    assert legacy_clean_ansi(text) == SocketClient.clean_ansi(text), "输出不一致"
+    before = bench(legacy_clean_ansi, text)
+    after = bench(SocketClient.clean_ansi, text)
+    size_kb = len(text.encode("utf-8")) / 1024
+    print(f"[{name}] {size_kb:.1f} KB")
+    print(f"  优化前: {before:10.0f} KB/s  ({1e6 / before:8.1f} us/KB)")
+    print(f"  优化后: {after:10.0f} KB/s  ({1e6 / after:8.1f} us/KB)")
+    print(f"  加速比: {after / before:.1f}x")
+
+
+if __name__ == "__main__":
+    print("=== clean_ansi Microbenchmark ===\n")
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "r", encoding="utf-8", errors="ignore") as f:
+            run_case(os.path.basename(sys.argv[1]), f.read())
+    else:
+        run_case("MUD 样本（中文）", SAMPLE_MUD_OUTPUT * 200)
+        run_case("MUD 样本（纯 ASCII）", SAMPLE_ASCII_OUTPUT * 200)
@@ -0,0 +1,51 @@
+"""
+json_repair 单元测试：代码块包装、多余逗号、被截断的响应。
+
+用法:
+    python -m pytest tests/test_json_repair.py
+"""
+import os
+import sys
+
+import pytest
+
+# Add parent directory to sys.path to import json_repair
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from json_repair import JsonRepairError, fill_defaults, repair_json
+
+
+def test_valid_json_with_fence_inside_string_is_untouched():
+    text = '{"analysis": "use ```look``` now", "next_payload": "look"}'
+    assert repair_json(text) == {"analysis": "use ```look``` now", "next_payload": "look"}
+
+
+def test_fenced_response_with_surrounding_text():
+    text = '好的，结果如下：\n```json\n{"next_payload": "look", "commands": [],}\n```\n希望有帮助'
+    assert repair_json(text) == {"next_payload": "look", "commands": []}
+
+
+def test_truncated_string_and_brackets():
+    text = '{"analysis": "房间里有一扇门", "commands": [{"payload": "open door", "expect": "门开'
+    assert repair_json(text) == {
+        "analysis": "房间里有一扇门",
+        "commands": [{"payload": "open door", "expect": "门开"}],
+    }
+
+
+def test_truncated_after_key_drops_dangling_pair():
+    assert repair_json('{"a": 1, "b": ') == {"a": 1}
+
+
+def test_truncated_inside_fence():
+    assert repair_json('```json\n{"a": [1, 2\n```') == {"a": [1, 2]}
+
+
+def test_unrepairable_raises_with_content():
+    with pytest.raises(JsonRepairError) as info:
+        repair_json("抱歉，我无法回答。")
+    assert info.value.content == "抱歉，我无法回答。"
+
+
+def test_fill_defaults_keeps_existing_values():
+    assert fill_defaults({"a": 1}, {"a": 2, "b": ""}) == {"a": 1, "b": ""}
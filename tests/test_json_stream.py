@@ -0,0 +1,68 @@
+"""
+JsonFieldExtractor 单元测试：任意切分的流式 JSON 中顶层字段的提取。
+
+用法:
+    python -m pytest tests/test_json_stream.py
+"""
+import json
+import os
+import random
+import sys
+
+# Add parent directory to sys.path to import json_stream
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from json_stream import JsonFieldExtractor
+
+DECISION = {
+    "use_skill": "",
+    "next_payload": "say \"你好\", {friend}",
+    "commands": [{"payload": "look", "expect": "出口[:：]"}, {"payload": "i", "expect": ""}],
+    "expected_result": "看到房间描述",
+    "analysis": "反斜杠 \\ 和括号 ] } 不影响解析",
+    "task_completed": False,
+    "attempts": 3,
+    "ratio": -1.5e2,
+    "extra": None,
+}
+
+
+def feed_chunks(text: str, sizes) -> tuple[JsonFieldExtractor, list]:
+    extractor = JsonFieldExtractor()
+    done = []
+    pos = 0
+    for size in sizes:
+        done.extend(extractor.feed(text[pos:pos + size]))
+        pos += size
+    done.extend(extractor.feed(text[pos:]))
+    return extractor, done
+
+
+def test_fields_in_order_with_bytewise_chunks():
+    text = json.dumps(DECISION, ensure_ascii=False, indent=2)
+    extractor, done = feed_chunks(text, [1] * len(text))
+    assert [k for k, _ in done] == list(DECISION)
+    assert extractor.fields == DECISION
+
+
+def test_random_chunkings():
+    text = json.dumps(DECISION, ensure_ascii=False)
+    rng = random.Random(0)
+    for _ in range(100):
+        sizes = [rng.randint(1, 12) for _ in range(len(text))]
+        extractor, done = feed_chunks(text, sizes)
+        assert dict(done) == DECISION
+        assert extractor.text == text
+
+
+def test_string_field_reported_before_object_closes():
+    extractor = JsonFieldExtractor()
+    assert extractor.feed('{"next_payload": "lo') == []
+    assert extractor.feed('ok", "analysis": "正在') == [("next_payload", "look")]
+    assert extractor.fields == {"next_payload": "look"}
+
+
+def test_scalar_field_waits_for_delimiter():
+    extractor = JsonFieldExtractor()
+    assert extractor.feed('{"attempts": 12') == []
+    assert extractor.feed("3}") == [("attempts", 123)]
@@ -0,0 +1,57 @@
+"""
+LineFramer 单元测试：多字节字符跨数据段拆分时的解码与分帧。
+
+用法:
+    python -m pytest tests/test_line_framer.py
+"""
+import os
+import sys
+
+# Add parent directory to sys.path to import connection_manager
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from connection_manager import LineFramer
+
+DATA = "你好\r\n世界> ".encode("utf-8")
+
+
+def test_bytewise_feed_keeps_multibyte_characters():
+    framer = LineFramer()
+    for i in range(len(DATA)):
+        framer.feed(DATA[i:i + 1])
+    assert framer.partial == "世界> "
+    assert framer.pending_bytes() == len(DATA)
+    lines, partial, raw = framer.drain()
+    assert lines == ["你好"]
+    assert partial == "世界> "
+    assert isinstance(raw, memoryview)
+    assert raw.tobytes() == DATA
+    assert not framer.has_data()
+
+
+def test_incomplete_character_is_not_reported_as_data():
+    framer = LineFramer()
+    head = "你".encode("utf-8")
+    framer.feed(head[:2])
+    assert not framer.has_data()
+    framer.feed(head[2:])
+    assert framer.partial == "你"
+
+
+def test_drain_without_partial_keeps_tail():
+    framer = LineFramer()
+    framer.feed(DATA)
+    lines, partial, raw = framer.drain(include_partial=False)
+    assert (lines, partial) == (["你好"], "")
+    assert raw.tobytes() == DATA
+    assert framer.partial == "世界> "
+    assert framer.pending_bytes() == 0
+
+
+def test_raw_view_survives_further_feeds():
+    framer = LineFramer()
+    framer.feed(DATA)
+    _, _, raw = framer.drain()
+    framer.feed(b"more\n")
+    assert raw.tobytes() == DATA
+    assert framer.drain()[0] == ["more"]
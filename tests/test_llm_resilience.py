@@ -0,0 +1,199 @@
+"""
+LLM 容错单元测试：熔断与备用端点、重试预算的耗尽与恢复、对冲请求。
+用桩替换 chat.completions 客户端，不访问网络。
+
+用法:
+    python -m pytest tests/test_llm_resilience.py
+"""
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+# Add parent directory to sys.path to import llm_client
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+import llm_resilience
+from llm_client import AsyncLLMClient
+from llm_resilience import CircuitBreaker, LLMRetryBudgetExceeded, RetryBudget
+
+
+class FakeCompletions:
+    """按调用顺序执行 behaviors 中的协程函数（最后一个重复使用），记录每次请求"""
+
+    def __init__(self, *behaviors):
+        self.behaviors = list(behaviors)
+        self.requests = []
+        self.cancelled = 0
+
+    async def create(self, **kwargs):
+        self.requests.append(kwargs)
+        behavior = self.behaviors[min(len(self.requests), len(self.behaviors)) - 1]
+        try:
+            return await behavior()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+
+
+def fake_openai(*behaviors) -> SimpleNamespace:
+    return SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions(*behaviors)))
+
+
+def reply(content: str = '{"ok": 1}', delay: float = 0.0):
+    async def behavior():
+        await asyncio.sleep(delay)
+        message = SimpleNamespace(content=content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+    return behavior
+
+
+async def fail():
+    raise ConnectionError("provider down")
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def make_client(monkeypatch):
+    monkeypatch.setattr(config, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(config, "LLM_FALLBACKS", {})
+
+    def make(primary) -> AsyncLLMClient:
+        client = AsyncLLMClient(api_key="test", base_url="http://primary", model="main")
+        client.client = primary
+        return client
+    return make
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    # 只替换 llm_resilience 看到的时钟，事件循环仍用真实时间
+    monkeypatch.setattr(llm_resilience, "time", SimpleNamespace(monotonic=clock))
+    return clock
+
+
+# ---------------------------------------------------------------- 熔断器
+
+def test_breaker_opens_and_falls_back(make_client, monkeypatch):
+    monkeypatch.setattr(config, "LLM_BREAKER_FAILURES", 2)
+    monkeypatch.setattr(config, "LLM_BREAKER_COOLDOWN", 60.0)
+    monkeypatch.setattr(config, "LLM_FALLBACKS", {"main": {"model": "backup", "base_url": "http://fallback"}})
+    primary = fake_openai(fail)
+    fallback = fake_openai(reply('{"from": "fallback"}'))
+    client = make_client(primary)
+    client._fallback_clients["http://fallback"] = fallback
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(ConnectionError):
+                await client.query("s", "u", caller_id="Analyze[T1]")
+        return await client.query("s", "u", caller_id="Analyze[T1]")
+
+    assert asyncio.run(scenario()) == {"from": "fallback"}
+    assert len(primary.chat.completions.requests) == 2
+    assert fallback.chat.completions.requests[0]["model"] == "backup"
+    assert client._breaker("main@http://primary").is_open
+
+
+def test_breaker_half_open_probe(clock, monkeypatch):
+    monkeypatch.setattr(config, "LLM_BREAKER_FAILURES", 2)
+    monkeypatch.setattr(config, "LLM_BREAKER_COOLDOWN", 10.0)
+    breaker = CircuitBreaker("main")
+    assert not breaker.record_failure()
+    assert breaker.record_failure()
+    assert not breaker.allow()
+
+    clock.now += 10.0
+    assert breaker.allow()       # 半开：放行一次试探请求
+    assert not breaker.allow()   # 试探期间其余请求仍走备用端点
+    breaker.record_failure()     # 试探失败，重新冷却
+    clock.now += 5.0
+    assert not breaker.allow()
+
+    clock.now += 10.0
+    assert breaker.allow()
+    breaker.record_success()
+    assert not breaker.is_open and breaker.allow()
+
+
+# ---------------------------------------------------------------- 重试预算
+
+def test_retry_budget_exhausts_and_refills(clock):
+    budget = RetryBudget(2, window=10.0)
+    assert budget.try_spend() and budget.try_spend()
+    assert not budget.try_spend()
+    clock.now += 4.0             # 每 5 秒恢复一次
+    assert not budget.try_spend()
+    clock.now += 1.0
+    assert budget.try_spend()
+    assert not budget.try_spend()
+    clock.now += 100.0           # 恢复不超过容量
+    assert budget.try_spend() and budget.try_spend()
+    assert not budget.try_spend()
+
+
+def test_call_with_retry_shares_budget_across_calls(make_client, monkeypatch, clock):
+    monkeypatch.setattr(config, "LLM_RETRY_BUDGETS", {"Analyze": 2})
+    monkeypatch.setattr(config, "LLM_RETRY_BUDGET_WINDOW", 10.0)
+    primary = fake_openai(fail)
+    client = make_client(primary)
+    requests = primary.chat.completions.requests
+
+    async def call():
+        return await client.call_with_retry("s", "u", retry_delay=0, caller_id="Analyze[T1]")
+
+    with pytest.raises(LLMRetryBudgetExceeded) as info:
+        asyncio.run(call())
+    assert info.value.attempts == 3 and len(requests) == 3
+
+    # 预算已耗尽：下一次调用失败一次就放弃
+    with pytest.raises(LLMRetryBudgetExceeded) as info:
+        asyncio.run(call())
+    assert info.value.attempts == 1 and len(requests) == 4
+
+    # 预算恢复后重试成功
+    clock.now += 5.0
+    primary.chat.completions.behaviors = [fail, reply()]
+    primary.chat.completions.requests = requests = []
+    assert asyncio.run(call()) == {"ok": 1}
+    assert len(requests) == 2
+
+
+# ---------------------------------------------------------------- 对冲请求
+
+def _prime_latency(client: AsyncLLMClient, seconds: float, monkeypatch):
+    monkeypatch.setattr(config, "LLM_HEDGE_MIN_SAMPLES", 3)
+    for _ in range(3):
+        client._latency("main@http://primary").add(seconds)
+
+
+def test_hedge_wins_and_cancels_slow_request(make_client, monkeypatch):
+    primary = fake_openai(reply('{"from": "slow"}', delay=5.0), reply('{"from": "hedge"}'))
+    client = make_client(primary)
+    _prime_latency(client, 0.05, monkeypatch)
+
+    result = asyncio.run(client.query("s", "u", caller_id="Analyze[T1]"))
+    assert result == {"from": "hedge"}
+    assert len(primary.chat.completions.requests) == 2
+    assert primary.chat.completions.cancelled == 1
+
+
+def test_correction_calls_are_not_hedged(make_client, monkeypatch):
+    primary = fake_openai(reply('{"from": "only"}', delay=0.2))
+    client = make_client(primary)
+    _prime_latency(client, 0.05, monkeypatch)
+
+    result = asyncio.run(client.query("s", "u", caller_id="Analyze-Correct"))
+    assert result == {"from": "only"}
+    assert len(primary.chat.completions.requests) == 1
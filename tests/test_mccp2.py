@@ -0,0 +1,72 @@
+"""
+MCCP2 单元测试：压缩在数据段中间开始、在数据段中间结束时的解压与 Telnet 解析。
+
+用法:
+    python -m pytest tests/test_mccp2.py
+"""
+import os
+import sys
+import zlib
+
+# Add parent directory to sys.path to import connection_manager
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from connection_manager import SocketClient, IAC, WILL, DO, SB, SE, OPT_MCCP2
+
+START = bytes((IAC, SB, OPT_MCCP2, IAC, SE))
+
+
+class FakeTransport:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def make_client() -> SocketClient:
+    client = SocketClient("127.0.0.1", 1)
+    transport = FakeTransport()
+    client._ingest(bytes((IAC, WILL, OPT_MCCP2)), transport)
+    assert client._telnet.take_replies() == bytes((IAC, DO, OPT_MCCP2))
+    return client
+
+
+def compress(data: bytes) -> bytes:
+    c = zlib.compressobj()
+    return c.compress(data) + c.flush()
+
+
+def test_compression_starts_mid_chunk():
+    client = make_client()
+    out = client._ingest(b"plain " + START + compress("压缩的房间描述\r\n".encode("utf-8")), FakeTransport())
+    assert out == b"plain " + "压缩的房间描述\r\n".encode("utf-8")
+    assert client._inflater is None  # 压缩流已结束
+
+
+def test_compression_ends_mid_chunk_and_resumes_plain():
+    client = make_client()
+    stream = START + compress(b"inside") + b"outside"
+    assert client._ingest(stream, FakeTransport()) == b"insideoutside"
+    assert client._inflater is None
+
+
+def test_compressed_stream_split_bytewise():
+    client = make_client()
+    inner = b"line one\r\n" + bytes((IAC, IAC)) + b"line two\r\n"
+    stream = b"a" + START + compress(inner) + b"z"
+    out = b"".join(client._ingest(stream[i:i + 1], FakeTransport()) for i in range(len(stream)))
+    assert out == b"a" + b"line one\r\n\xffline two\r\n" + b"z"
+
+
+def test_compression_ignored_when_not_negotiated():
+    client = SocketClient("127.0.0.1", 1)
+    assert client._ingest(START + b"text", FakeTransport()) == b"text"
+    assert client._inflater is None
+
+
+def test_corrupt_stream_closes_transport():
+    client = make_client()
+    transport = FakeTransport()
+    client._ingest(START + b"not zlib data", transport)
+    assert transport.closed
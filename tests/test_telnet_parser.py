@@ -0,0 +1,65 @@
+"""
+TelnetParser 单元测试：IAC 序列和子协商跨数据段拆分时的解析。
+
+用法:
+    python -m pytest tests/test_telnet_parser.py
+"""
+import os
+import sys
+
+# Add parent directory to sys.path to import connection_manager
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from connection_manager import (
+    TelnetParser, IAC, WILL, DO, DONT, SB, SE, GA, OPT_ECHO, OPT_GMCP,
+)
+
+
+def feed_bytewise(parser: TelnetParser, data: bytes) -> bytes:
+    return b"".join(parser.feed(data[i:i + 1]) for i in range(len(data)))
+
+
+def test_plain_data_passes_through():
+    parser = TelnetParser()
+    assert parser.feed("你好 world\r\n".encode("utf-8")) == "你好 world\r\n".encode("utf-8")
+    assert parser.take_events() == []
+
+
+def test_escaped_iac_split_across_chunks():
+    parser = TelnetParser()
+    assert parser.feed(b"a" + bytes((IAC,))) == b"a"
+    assert parser.feed(bytes((IAC,)) + b"b") == bytes((IAC,)) + b"b"
+
+
+def test_negotiation_split_across_chunks():
+    parser = TelnetParser()
+    assert parser.feed(b"x" + bytes((IAC, WILL))) == b"x"
+    assert parser.feed(bytes((OPT_ECHO,)) + b"y") == b"y"
+    assert parser.take_replies() == bytes((IAC, DO, OPT_ECHO))
+    # 不支持的选项直接拒绝
+    parser.feed(bytes((IAC, WILL, 99)))
+    assert parser.take_replies() == bytes((IAC, DONT, 99))
+
+
+def test_subnegotiation_split_bytewise():
+    payload = b'Room.Info {"name": "\xe5\xb9\xbf\xe5\x9c\xba"}'
+    data = b"before" + bytes((IAC, SB, OPT_GMCP)) + payload + bytes((IAC, SE)) + b"after"
+    parser = TelnetParser()
+    assert feed_bytewise(parser, data) == b"beforeafter"
+    assert parser.take_events() == [{"type": "subnegotiation", "option": OPT_GMCP, "payload": payload}]
+
+
+def test_subnegotiation_with_escaped_iac_split_at_iac():
+    parser = TelnetParser()
+    assert parser.feed(bytes((IAC, SB, OPT_GMCP)) + b"a" + bytes((IAC,))) == b""
+    assert parser.feed(bytes((IAC,)) + b"b" + bytes((IAC,))) == b""
+    assert parser.feed(bytes((SE,)) + b"rest") == b"rest"
+    events = parser.take_events()
+    assert events == [{"type": "subnegotiation", "option": OPT_GMCP, "payload": b"a\xffb"}]
+
+
+def test_go_ahead_reported_as_event():
+    parser = TelnetParser()
+    assert parser.feed(b"> " + bytes((IAC,))) == b"> "
+    assert parser.feed(bytes((GA,))) == b""
+    assert parser.take_events() == [{"type": "command", "command": GA}]